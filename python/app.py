@@ -1,34 +1,151 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+import functools
 import os
 import google.generativeai as genai
-from datetime import datetime
 import re
 
+from services.admission import OVERLOAD_POLICIES, AdmissionController
+from services.candidate_selection import candidate_settings, collect_candidates, select_best
+from services.generation_result import GenerationResult, PreEncodedResult
+from services.input_assessment import assess_batch, is_structural_junk
+from services.model_router import get_router
+from services.output_quality import score_output
+from services.partial_regeneration import (
+    SectionError, build_partial_prompt, merge_sections, output_token_budget,
+    parse_partial_response, parse_sections, validate_content
+)
+from services.scheduler import PRIORITY_CLASSES, SCHEDULER, parse_user_weights
+
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if GEMINI_API_KEY: 
-    genai.configure(api_key=GEMINI_API_KEY)
-    print("✅ Gemini API configured successfully")
+# Configure Gemini - every (key, model) pair is a routing target
+ROUTER = get_router()
+GEMINI_CONFIGURED = bool(ROUTER.targets)
+if GEMINI_CONFIGURED: 
+    print(f"✅ Gemini API configured: {ROUTER.key_count} key(s), {len(ROUTER.targets)} target(s)")
 else:
-    print("⚠️ WARNING: GEMINI_API_KEY not found in environment variables")
+    print("⚠️ WARNING: GEMINI_API_KEY / GEMINI_API_KEYS not found in environment variables")
+
+GEMINI_MODEL = 'gemini-1.5-flash'  # Reported for fallback content
+MIN_QUALITY_SCORE = 35  # Below this generate_with_gemini skips the API call
+MAX_ASSESS_RECORDS = 20000
+
+# Outbound Gemini calls go through the shared priority/fair-share scheduler
+SCHEDULER.configure(
+    max_concurrent=int(os.getenv('GEMINI_MAX_CONCURRENT', 4 * max(ROUTER.key_count, 1))),
+    user_weights=parse_user_weights(os.getenv('SCHEDULER_USER_WEIGHTS'))
+)
+
+# Admission control: bounded in-flight requests, bounded wait, per-endpoint overload policy
+ADMISSION = AdmissionController(
+    max_in_flight=int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 2 * SCHEDULER.max_concurrent)),
+    max_queue_wait=float(os.getenv('ADMISSION_MAX_QUEUE_WAIT', 2.0))
+)
+OVERLOAD_POLICY = {
+    'generate': os.getenv('OVERLOAD_POLICY_GENERATE', 'fallback'),
+    'regenerate': os.getenv('OVERLOAD_POLICY_REGENERATE', 'reject'),
+}
+for endpoint_name, policy in OVERLOAD_POLICY.items():
+    if policy not in OVERLOAD_POLICIES:
+        raise ValueError(f"Overload policy for {endpoint_name} must be one of {OVERLOAD_POLICIES}, got '{policy}'")
+
+# Best-of-N candidates (GEMINI_CANDIDATES / GEMINI_CANDIDATE_MODE) - raises on a bad mode
+CANDIDATE_COUNT, CANDIDATE_MODE = candidate_settings()
+
+def json_response(body, status=200):
+    """Wrap already-encoded JSON bytes without going through jsonify"""
+    return Response(body, status=status, mimetype='application/json')
+
+def overloaded_response():
+    return jsonify({
+        'success': False,
+        'error': 'Service overloaded, please retry'
+    }), 503, {'Retry-After': str(ADMISSION.retry_after())}
+
+def admission_controlled(endpoint_name, shed_handler):
+    """
+    Admit the request under ADMISSION or shed it
+    
+    With the 'fallback' policy `shed_handler()` builds an immediate
+    response (it may return None to fall through to 503); with 'reject'
+    the client gets 503 and Retry-After.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            admitted_at = ADMISSION.enter(endpoint_name)
+            if admitted_at is None:
+                policy = OVERLOAD_POLICY[endpoint_name]
+                response = shed_handler() if policy == 'fallback' else None
+                ADMISSION.record_shed(endpoint_name, policy if response is not None else 'reject')
+                print(f"🚦 Shed /{endpoint_name} request ({policy})")
+                return response if response is not None else overloaded_response()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                ADMISSION.leave(admitted_at)
+        return wrapper
+    return decorator
+
+def is_valid_user_id(user_id):
+    """Scheduler fair-share keys must be scalars; the scheduler uses their string form"""
+    return user_id is None or isinstance(user_id, (str, int, float))
+
+def shed_generate():
+    """Canned content for the request body, flagged as shed - no model call"""
+    data = request.get_json(silent=True) or {}
+    field_values = data.get('field_values') if isinstance(data.get('field_values'), dict) else None
+    fallback = create_intelligent_fallback(field_values, data.get('style_selected', 'professional'))
+    fallback.shed = True
+    return json_response(fallback.response_body(model=GEMINI_MODEL))
+
+def shed_regenerate():
+    """Existing content unchanged, flagged as shed"""
+    data = request.get_json(silent=True) or {}
+    generated_content = data.get('generated_content')
+    sections = data.get('sections')
+    if not isinstance(sections, list):
+        return None
+    try:
+        validate_content(generated_content)
+    except SectionError:
+        return None
+    result = merge_sections(generated_content, {})
+    result.shed = True
+    return jsonify({
+        'success': True,
+        'generated_content': result.to_dict(),
+        'regenerated_sections': [],
+        'unchanged_sections': sections,
+        'model': GEMINI_MODEL,
+        'timestamp': result.generated_at
+    })
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'ok',
         'service': 'AI Generation Service (Python)',
-        'model': 'gemini-1.5-flash',
-        'api_key_configured': bool(GEMINI_API_KEY)
+        'model': GEMINI_MODEL,
+        'models': sorted({target.model_name for target in ROUTER.targets}),
+        'api_key_configured': GEMINI_CONFIGURED
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def service_metrics():
+    return jsonify({
+        'admission': ADMISSION.metrics(),
+        'scheduler': SCHEDULER.metrics(),
+        'router': ROUTER.usage()
     })
 
 @app.route('/api/generate', methods=['POST'])
+@admission_controlled('generate', shed_generate)
 def generate_content():
     try:
         data = request.get_json()
@@ -41,6 +158,8 @@ def generate_content():
         
         field_values = data.get('field_values')
         style_selected = data.get('style_selected', 'professional')
+        user_id = data.get('user_id')
+        priority = data.get('priority', 'interactive')
         
         if not field_values:
             return jsonify({
@@ -48,23 +167,30 @@ def generate_content():
                 'error':  'field_values is required'
             }), 400
         
-        print(f"\n🚀 Generating content with style: {style_selected}")
+        if priority not in PRIORITY_CLASSES:
+            return jsonify({
+                'success': False,
+                'error': f"priority must be one of {', '.join(PRIORITY_CLASSES)}"
+            }), 400
+        
+        if not is_valid_user_id(user_id):
+            return jsonify({
+                'success': False,
+                'error': 'user_id must be a string or number'
+            }), 400
+        
+        print(f"\n🚀 Generating content with style: {style_selected} ({priority}, user {user_id})")
         print(f"📝 Field values received: {list(field_values.keys())}")
         
         # Generate content using Gemini
-        result = generate_with_gemini(field_values, style_selected)
+        result = generate_with_gemini(field_values, style_selected, user_id=user_id, priority=priority)
         
         print(f"✅ Generated content successfully")
-        print(f"   Headline: {result. get('headline', 'N/A')[:50]}...")
-        print(f"   Body length: {len(result.get('body_text', ''))} chars")
-        print(f"   Fallback used: {result.get('fallback', False)}")
+        print(f"   Headline: {result.headline[:50]}...")
+        print(f"   Body length: {len(result.body_text)} chars")
+        print(f"   Fallback used: {result.fallback}")
         
-        return jsonify({
-            'success': True,
-            'generated_content': result,
-            'model': 'gemini-1.5-flash',
-            'timestamp': result.get('generated_at')
-        })
+        return json_response(result.response_body(model=result.model or GEMINI_MODEL))
         
     except Exception as e:
         print(f"❌ Error in generate_content: {str(e)}")
@@ -72,10 +198,135 @@ def generate_content():
         traceback.print_exc()
         
         # Return fallback content
+        fallback = create_intelligent_fallback(field_values, style_selected)
+        return json_response(fallback.response_body(model=GEMINI_MODEL))
+
+@app.route('/api/regenerate', methods=['POST'])
+@admission_controlled('regenerate', shed_regenerate)
+def regenerate_sections():
+    """Regenerate only the requested sections of existing content and merge them back"""
+    data = request.get_json(silent=True) or {}
+    generated_content = data.get('generated_content')
+    sections = data.get('sections')
+    style_selected = data.get('style_selected', 'professional')
+    
+    if not isinstance(generated_content, dict) or not isinstance(sections, list) or not sections:
+        return jsonify({
+            'success': False,
+            'error': 'generated_content and a non-empty sections list are required'
+        }), 400
+    
+    if data.get('field_values') is not None and not isinstance(data.get('field_values'), dict):
         return jsonify({
-            'success': True,
-            'generated_content':  create_intelligent_fallback(field_values, style_selected),
-        })
+            'success': False,
+            'error': 'field_values must be an object'
+        }), 400
+    
+    if not is_valid_user_id(data.get('user_id')):
+        return jsonify({
+            'success': False,
+            'error': 'user_id must be a string or number'
+        }), 400
+    
+    try:
+        validate_content(generated_content)
+        sections = parse_sections(sections, generated_content)
+    except SectionError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    print(f"\n✏️ Regenerating sections {sections} with style: {style_selected}")
+    
+    replacements = {}
+    model = None
+    if GEMINI_CONFIGURED:
+        cleaned_values, _ = clean_and_assess_input(data.get('field_values'))
+        prompt = build_partial_prompt(
+            generated_content,
+            sections,
+            build_context(cleaned_values),
+            STYLE_MAP.get(style_selected, STYLE_MAP['professional'])
+        )
+        try:
+            response, target = SCHEDULER.run(
+                lambda: ROUTER.generate(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        max_output_tokens=output_token_budget(sections),
+                        temperature=0.9,
+                        top_p=0.95,
+                        top_k=40
+                    )
+                ),
+                user_id=data.get('user_id'),
+                priority='interactive'
+            )
+            replacements = parse_partial_response(response.text, sections)
+            model = target.model_name
+        except Exception as e:
+            print(f"❌ Gemini Error: {str(e)}")
+    else:
+        print("⚠️ No API key, keeping existing sections")
+    
+    result = merge_sections(generated_content, replacements, model=model)
+    return jsonify({
+        'success': True,
+        'generated_content': result.to_dict(),
+        'regenerated_sections': [section for section in sections if section in replacements],
+        'unchanged_sections': [section for section in sections if section not in replacements],
+        'model': model or GEMINI_MODEL,
+        'timestamp': result.generated_at
+    })
+
+@app.route('/api/assess', methods=['POST'])
+def assess_inputs():
+    """Score many field_values records at once, using the same rules as generation"""
+    data = request.get_json(silent=True)
+    records = data.get('records') if isinstance(data, dict) else None
+    
+    if not isinstance(records, list):
+        return jsonify({
+            'success': False,
+            'error': 'records must be a list of field_values objects'
+        }), 400
+    
+    if len(records) > MAX_ASSESS_RECORDS:
+        return jsonify({
+            'success': False,
+            'error': f'At most {MAX_ASSESS_RECORDS} records per request'
+        }), 400
+    
+    if any(record is not None and not isinstance(record, dict) for record in records):
+        return jsonify({
+            'success': False,
+            'error': 'Each record must be a field_values object'
+        }), 400
+    
+    assessed = assess_batch(records)
+    results = [
+        {
+            'index': index,
+            'score': score,
+            'cleaned_fields': cleaned,
+            'will_generate': score >= MIN_QUALITY_SCORE
+        }
+        for index, (cleaned, score) in enumerate(assessed)
+    ]
+    worth_generating = sum(1 for result in results if result['will_generate'])
+    
+    print(f"📊 Assessed {len(results)} records: {worth_generating} worth a Gemini call")
+    
+    return jsonify({
+        'success': True,
+        'results': results,
+        'summary': {
+            'total': len(results),
+            'will_generate': worth_generating,
+            'fallback': len(results) - worth_generating
+        }
+    })
 
 def clean_and_assess_input(field_values):
     """Clean input and assess quality - returns (cleaned_dict, score)"""
@@ -87,18 +338,6 @@ def clean_and_assess_input(field_values):
     total_chars = 0
     meaningful_count = 0
     
-    # EXPANDED Junk patterns - catch MORE variations
-    junk_patterns = [
-        r'^(hi+|hey+|test+|testing|n/?  a|null|none|placeholder|example|sample|general|audience|default|demo)$',
-        r'^[a-z]{1,2}$',  # 1-2 letters only
-        r'^(. )\1{3,}$',  # Repeated single char:  aaaa, hhhh  
-        r'^(hi\s*){2,}$',  # "hi hi hi"
-        r'^\d+$',  # Just numbers
-        r'^(. {2,4})\1{2,}$',  # Pattern repetition:  hihi, testtest, hihihihi
-        r'^(hi|test|demo).{0,10}(hi|test|demo)$',  # Variations with hi/test
-        r'^[a-z]{2,10}(d{2,}|i{2,}|h{2,})$',  # Patterns like "hihihihidd"
-    ]
-    
     for field_name, field_value in field_values.items():
         if not field_value or not str(field_value).strip():
             continue
@@ -107,7 +346,7 @@ def clean_and_assess_input(field_values):
         value_lower = value_str.lower()
         
         # Check if junk
-        is_junk = any(re.match(pattern, value_lower) for pattern in junk_patterns)
+        is_junk = is_structural_junk(value_str, value_lower)
         
         # Additional checks
         if len(value_str) < 4:  # Too short
@@ -122,24 +361,6 @@ def clean_and_assess_input(field_values):
             if max_char_count > len(value_str) * 0.5:  # More than 50% is one char
                 is_junk = True
         
-        # Check for repetitive patterns
-        if len(value_str) >= 4: 
-            # Check if it's made of 2-3 char repeated patterns
-            for pattern_len in [2, 3, 4]:
-                if len(value_str) >= pattern_len * 2:
-                    pattern = value_str[:pattern_len]
-                    if value_str.replace(pattern, '').replace(pattern. upper(), '') == '' or \
-                       len(value_str. replace(pattern, '')) < 3:
-                        is_junk = True
-                        break
-        
-        # Word repetition check
-        words = value_str.split()
-        if len(words) > 2:
-            unique_words = set(words)
-            if len(unique_words) / len(words) < 0.5:  # Less than 50% unique
-                is_junk = True
-        
         if not is_junk:
             cleaned[field_name] = value_str
             meaningful_count += 1
@@ -167,117 +388,18 @@ def clean_and_assess_input(field_values):
         score += 15
     
     return cleaned, min(score, 100)
-    """Clean input and assess quality - returns (cleaned_dict, score)"""
-    if not field_values:
-        return {}, 0
-    
-    cleaned = {}
-    score = 0
-    total_chars = 0
-    meaningful_count = 0
-    
-    # Junk patterns
-    junk_patterns = [
-        r'^(hi+|hey+|test+|testing|n/? a|null|none|placeholder|example|sample|general|audience)$',
-        r'^[a-z]{1,2}$',  # 1-2 letters
-        r'^(. )\1{3,}$',  # Repeated chars:  aaaa, hihihi  
-        r'^(hi\s*){2,}$',  # "hi hi hi"
-        r'^\d+$',  # Just numbers
-        r'^(. {2,4})\1{2,}$',  # Pattern repetition:  "hihi", "testtest"
-    ]
-    
-    for field_name, field_value in field_values.items():
-        if not field_value or not str(field_value).strip():
-            continue
-        
-        value_str = str(field_value).strip()
-        value_lower = value_str.lower()
-        
-        # Check if junk
-        is_junk = any(re.match(pattern, value_lower) for pattern in junk_patterns)
-        
-        if len(value_str) < 3:
-            is_junk = True
-        
-        # Check for repetition within value
-        words = value_str.split()
-        if len(words) > 2:
-            unique_words = set(words)
-            if len(unique_words) / len(words) < 0.4:  # Less than 40% unique
-                is_junk = True
-        
-        if not is_junk:
-            cleaned[field_name] = value_str
-            meaningful_count += 1
-            char_count = len(value_str)
-            total_chars += char_count
-            
-            if char_count > 15:
-                score += 35
-            elif char_count > 8:
-                score += 20
-            else:
-                score += 8
-    
-    # Bonuses
-    if meaningful_count >= 3:
-        score += 30
-    elif meaningful_count == 2:
-        score += 15
-    
-    if total_chars > 100:
-        score += 20
-    elif total_chars > 50:
-        score += 10
-    
-    return cleaned, min(score, 100)
 
-def generate_with_gemini(field_values, style_selected):
-    """Generate content using Google Gemini API with validation"""
-    
-    if not GEMINI_API_KEY: 
-        print("⚠️ No API key, using fallback")
-        return create_intelligent_fallback(field_values, style_selected)
-    
-    # Clean and assess input
-    cleaned_values, quality_score = clean_and_assess_input(field_values)
-    
-    print(f"📊 Input quality score: {quality_score}/100")
-    print(f"🧹 Cleaned:  {len(cleaned_values)} meaningful fields")
-    
-    # If too low quality, skip API call
-    if quality_score < 35:
-        print(f"⚠️ Quality too low ({quality_score}) - using fallback")
-        return create_intelligent_fallback(cleaned_values, style_selected)
-    
-    try:
-        # Style instructions
-        style_map = {
-            'professional': 'formal, professional, and authoritative',
-            'casual': 'friendly, conversational, and relaxed',
-            'creative': 'imaginative, unique, and artistic with vivid imagery',
-            'technical': 'detailed, precise, with industry terminology',
-            'persuasive': 'convincing, compelling, and action-oriented'
-        }
-        
-        style_desc = style_map.get(style_selected, style_map['professional'])
-        
-        # Build context
-        if not cleaned_values:
-            context = "Create engaging content about business innovation and success."
-        else:
-            lines = []
-            for name, value in cleaned_values.items():
-                formatted = name.replace('_', ' ').title()
-                lines.append(f"• {formatted}: {value}")
-            context = "\n".join(lines)
-        
-        prompt = f"""You are an expert content writer.  Create compelling, original content. 
-
-**Context:**
-{context}
+# Style instructions
+STYLE_MAP = {
+    'professional': 'formal, professional, and authoritative',
+    'casual': 'friendly, conversational, and relaxed',
+    'creative': 'imaginative, unique, and artistic with vivid imagery',
+    'technical': 'detailed, precise, with industry terminology',
+    'persuasive': 'convincing, compelling, and action-oriented'
+}
 
-**Style:** {style_desc}
+# Fixed instruction block, passed to the router as the prompt prefix
+PROMPT_PREFIX = """You are an expert content writer.  Create compelling, original content from the context and style given after these instructions. 
 
 **STRICT RULES:**
 1. Write 3-4 DISTINCT paragraphs, each covering a DIFFERENT aspect
@@ -294,45 +416,111 @@ HEADLINE: [8-12 words, compelling and specific]
 BODY_TEXT: [3-4 diverse paragraphs, 280-350 words total, rich vocabulary, zero repetition]
 
 CALL_TO_ACTION: [3-6 words, clear action]"""
+
+def build_context(cleaned_values):
+    """Context lines for the prompt from cleaned field values"""
+    if not cleaned_values:
+        return "Create engaging content about business innovation and success."
+    lines = []
+    for name, value in cleaned_values.items():
+        formatted = name.replace('_', ' ').title()
+        lines.append(f"• {formatted}: {value}")
+    return "\n".join(lines)
+
+def generate_with_gemini(field_values, style_selected, user_id=None, priority='interactive'):
+    """Generate content using Google Gemini API with validation
+    
+    The model call waits its turn in SCHEDULER: `priority` picks the class
+    (interactive, bulk, speculative) and `user_id` - forwarded by the Node
+    server - is the fair-share key within that class.
+    """
+    
+    if not GEMINI_CONFIGURED: 
+        print("⚠️ No API key, using fallback")
+        return create_intelligent_fallback(field_values, style_selected)
+    
+    # Clean and assess input
+    cleaned_values, quality_score = clean_and_assess_input(field_values)
+    
+    print(f"📊 Input quality score: {quality_score}/100")
+    print(f"🧹 Cleaned:  {len(cleaned_values)} meaningful fields")
+    
+    # If too low quality, skip API call
+    if quality_score < MIN_QUALITY_SCORE:
+        print(f"⚠️ Quality too low ({quality_score}) - using fallback")
+        return create_intelligent_fallback(cleaned_values, style_selected,
+                                           assessment=(cleaned_values, quality_score))
+    
+    try:
+        style_desc = STYLE_MAP.get(style_selected, STYLE_MAP['professional'])
+        context = build_context(cleaned_values)
         
-        print(f"🤖 Calling Gemini API...")
+        # Only the context and style vary; the instruction block is a static prefix
+        prompt = f"""**Context:**
+{context}
+
+**Style:** {style_desc}"""
         
-        # Use stable model with better quota
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        print(f"🤖 Calling Gemini API...")
         
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=1500,
-                temperature=0.9,
-                top_p=0.95,
-                top_k=40
+        # Router picks the healthiest key/model pair with rate budget left
+        def generate(count):
+            return SCHEDULER.run(
+                lambda: ROUTER.generate(
+                    prompt,
+                    prefix=PROMPT_PREFIX,
+                    generation_config=genai.types.GenerationConfig(
+                        max_output_tokens=1500,
+                        temperature=0.9,
+                        top_p=0.95,
+                        top_k=40,
+                        candidate_count=count
+                    )
+                ),
+                user_id=user_id,
+                priority=priority
             )
-        )
         
-        generated_text = response.text
-        print(f"📄 AI response length: {len(generated_text)} chars")
-        
-        # Parse
-        headline = extract_section(generated_text, 'HEADLINE')
-        body_text = extract_section(generated_text, 'BODY_TEXT')
-        cta = extract_section(generated_text, 'CALL_TO_ACTION')
+        # Best of N candidates when GEMINI_CANDIDATES > 1
+        result, target, _ = select_best(
+            collect_candidates(generate, CANDIDATE_COUNT, CANDIDATE_MODE),
+            parse_generated_text,
+            lambda content: score_candidate(content, cleaned_values)
+        )
         
         # Validate output
-        if not body_text or len(body_text) < 150:
+        if result is None:
             print(f"⚠️ Output too short, using fallback")
-            return create_intelligent_fallback(cleaned_values, style_selected)
+            return create_intelligent_fallback(cleaned_values, style_selected,
+                                               assessment=(cleaned_values, quality_score))
         
-        return {
-            'headline': headline or "Discover New Possibilities",
-            'body_text':  body_text,
-            'call_to_action': cta or "Learn More",
-            'generated_at': datetime.now().isoformat()
-        }
+        print(f"📄 AI body length: {len(result.body_text)} chars")
+        result.model = target.model_name
+        return result
         
     except Exception as e: 
         print(f"❌ Gemini Error: {str(e)}")
-        return create_intelligent_fallback(cleaned_values, style_selected)
+        return create_intelligent_fallback(cleaned_values, style_selected,
+                                           assessment=(cleaned_values, quality_score))
+
+def parse_generated_text(generated_text):
+    """Parse one model response into a GenerationResult"""
+    headline = extract_section(generated_text, 'HEADLINE')
+    body_text = extract_section(generated_text, 'BODY_TEXT')
+    cta = extract_section(generated_text, 'CALL_TO_ACTION')
+    
+    return GenerationResult(
+        headline=headline or "Discover New Possibilities",
+        body_text=body_text,
+        call_to_action=cta or "Learn More",
+    )
+
+def score_candidate(result, cleaned_values):
+    """Rank candidates by output quality; only a short body rules one out here"""
+    if not result.body_text or len(result.body_text) < 150:
+        return 0.0
+    # Repetition checks order candidates but, as before, do not force a fallback
+    return max(score_output(result.body_text, cleaned_values), 0.001)
 
 def extract_section(text, section_name):
     """Extract section from generated text"""
@@ -351,11 +539,65 @@ def extract_section(text, section_name):
     
     return ''
 
-def create_intelligent_fallback(field_values, style):
+# Subject-less fallback copy is constant per style, so its response payload is encoded once
+GENERIC_FALLBACKS = {
+    'professional': PreEncodedResult(
+        headline="Transform Strategic Performance",
+        body_text="""Strategic transformation demands sophisticated frameworks that integrate operational efficiency with innovation capacity. Organizations must navigate complexity while maintaining focus on measurable objectives and sustainable outcomes.
+
+Our methodology combines evidence-based practices with adaptive implementation strategies, enabling performance improvements across critical metrics.  This approach builds organizational resilience while delivering immediate value.
+
+Clients experience substantial gains in efficiency, competitive positioning, and stakeholder satisfaction.  These benefits compound over time through continuous optimization and committed partnership approaches.""",
+        call_to_action="Schedule Consultation",
+        model=GEMINI_MODEL,
+    ),
+    'casual': PreEncodedResult(
+        headline="Simplify Success Today",
+        body_text="""Looking for something that delivers without the complexity? You're in the right spot.  We focus on what actually matters and skip all the unnecessary fluff.
+
+No overcomplicated systems or confusing terminology here. Just clear direction and useful resources that make sense from day one and keep delivering value.
+
+The feedback speaks volumes:  people love how much easier their workflow becomes. Want to see what this could do for you? Let's make it happen.""",
+        call_to_action="Let's Chat",
+        model=GEMINI_MODEL,
+    ),
+    'creative': PreEncodedResult(
+        headline="Where Vision Becomes Reality",
+        body_text="""Picture landscapes where opportunities flourish like wildflowers after spring rains. Each petal represents potential, every stem a pathway, all roots forming foundations for growth beyond current boundaries.
+
+Innovation dances with tradition here, composing harmonies that resonate across experiential dimensions. What begins as curiosity transforms into mastery through journeys both challenging and exhilarating.
+
+Your narrative deserves extraordinary chapters. The pen awaits your grasp, pages hunger for your words, and destiny whispers invitations to commence writing your story today.""",
+        call_to_action="Begin Your Journey",
+        model=GEMINI_MODEL,
+    ),
+    'technical': PreEncodedResult(
+        headline="Enterprise Technical Solutions",
+        body_text="""System architecture employs distributed processing frameworks with sophisticated load-balancing algorithms to optimize resource allocation. Core components utilize asynchronous communication protocols ensuring high availability and fault tolerance.
+
+Implementation specifications strictly adhere to industry standards while providing extensibility through plugin architectures. Configuration management supports environment-specific parameters without requiring code modifications.
+
+Benchmark analyses reveal significant performance gains:  reduced latency profiles, enhanced throughput metrics, and improved scalability characteristics. Technical documentation includes comprehensive API references and deployment guides.""",
+        call_to_action="Access Documentation",
+        model=GEMINI_MODEL,
+    ),
+    'persuasive': PreEncodedResult(
+        headline="Seize Your Competitive Edge",
+        body_text="""Imagine achieving in weeks what others struggle with for years. That's exactly what awaits when you take decisive action today. Thousands have already discovered these powerful advantages—advantages now within your reach.
+
+The impact speaks for itself. Success stories arrive daily from people who decided enough was enough. They stopped waiting, started executing, and never looked back on their old approaches.
+
+Your moment has arrived. Don't let hesitation steal another opportunity from you. Join those who chose to win and discover what becomes possible through commitment to excellence.""",
+        call_to_action="Claim Your Spot",
+        model=GEMINI_MODEL,
+    ),
+}
+
+def create_intelligent_fallback(field_values, style, assessment=None):
     """Create quality fallback content based on style - NO junk usage"""
     
-    # Clean input first
-    cleaned, quality_score = clean_and_assess_input(field_values)
+    # Clean input first (callers that already assessed pass it through)
+    cleaned, quality_score = assessment or clean_and_assess_input(field_values)
     
     # ✅ CRITICAL: Only use cleaned values if quality is decent
     subject = None
@@ -375,102 +617,65 @@ def create_intelligent_fallback(field_values, style):
         if subject and len(set(subject_lower)) < len(subject) * 0.3:  # Less than 30% unique chars
             subject = None
     
+    if not subject:
+        return GENERIC_FALLBACKS.get(style, GENERIC_FALLBACKS['persuasive']).fresh()
+    
     # Style-specific content WITHOUT using junk
     if style == 'professional':
-        if subject: 
-            body = f"""Strategic initiatives around {subject} require comprehensive frameworks integrating operational excellence with innovative methodologies.  Organizations must balance efficiency optimization with adaptability to maintain competitive positioning.
+        body = f"""Strategic initiatives around {subject} require comprehensive frameworks integrating operational excellence with innovative methodologies.  Organizations must balance efficiency optimization with adaptability to maintain competitive positioning.
 
 Implementation begins with thorough capability assessments, stakeholder alignment, and customized roadmap development. Our evidence-based approach leverages industry insights while accommodating unique organizational requirements and constraints. 
 
 Measurable outcomes demonstrate enhanced performance metrics, improved engagement levels, and strengthened market presence. These results emerge from systematic optimization combined with continuous refinement processes."""
-            headline = f"Elevate Your {subject} Strategy"
-        else:
-            body = """Strategic transformation demands sophisticated frameworks that integrate operational efficiency with innovation capacity. Organizations must navigate complexity while maintaining focus on measurable objectives and sustainable outcomes.
-
-Our methodology combines evidence-based practices with adaptive implementation strategies, enabling performance improvements across critical metrics.  This approach builds organizational resilience while delivering immediate value.
-
-Clients experience substantial gains in efficiency, competitive positioning, and stakeholder satisfaction.  These benefits compound over time through continuous optimization and committed partnership approaches."""
-            headline = "Transform Strategic Performance"
+        headline = f"Elevate Your {subject} Strategy"
         cta = "Schedule Consultation"
         
     elif style == 'casual':
-        if subject:
-            body = f"""So you're interested in {subject}? Smart choice! Once you see how everything connects, it really clicks into place.
+        body = f"""So you're interested in {subject}? Smart choice! Once you see how everything connects, it really clicks into place.
 
 What sets this apart is the simplicity factor. No confusing procedures or technical jargon—just practical tools and straightforward guidance that actually helps you get stuff done.
 
 People consistently mention how quickly they notice improvements. Plus, you've got solid support whenever questions pop up. It's like having a knowledgeable friend in your corner."""
-            headline = f"Discover {subject} Made Simple"
-        else: 
-            body = """Looking for something that delivers without the complexity? You're in the right spot.  We focus on what actually matters and skip all the unnecessary fluff.
-
-No overcomplicated systems or confusing terminology here. Just clear direction and useful resources that make sense from day one and keep delivering value.
-
-The feedback speaks volumes:  people love how much easier their workflow becomes. Want to see what this could do for you? Let's make it happen."""
-            headline = "Simplify Success Today"
+        headline = f"Discover {subject} Made Simple"
         cta = "Let's Chat"
         
     elif style == 'creative':
-        if subject:
-            body = f"""Envision {subject} as your gateway to unexplored territories. Like an artist discovering new pigments, you'll unveil dimensions previously hidden from view—each revealing pathways toward extraordinary achievement.
+        body = f"""Envision {subject} as your gateway to unexplored territories. Like an artist discovering new pigments, you'll unveil dimensions previously hidden from view—each revealing pathways toward extraordinary achievement.
 
 Every interaction weaves fresh threads into your tapestry of success, blending innovation with intuition in patterns that surprise and inspire continuously throughout the journey.
 
 Your masterpiece awaits its creator. The canvas stands prepared, tools lie ready, and this moment beckons you to transform vision into vivid reality through bold imaginative strokes."""
-            headline = f"Reimagine Possibilities with {subject}"
-        else:
-            body = """Picture landscapes where opportunities flourish like wildflowers after spring rains. Each petal represents potential, every stem a pathway, all roots forming foundations for growth beyond current boundaries.
-
-Innovation dances with tradition here, composing harmonies that resonate across experiential dimensions. What begins as curiosity transforms into mastery through journeys both challenging and exhilarating.
-
-Your narrative deserves extraordinary chapters. The pen awaits your grasp, pages hunger for your words, and destiny whispers invitations to commence writing your story today."""
-            headline = "Where Vision Becomes Reality"
+        headline = f"Reimagine Possibilities with {subject}"
         cta = "Begin Your Journey"
         
-    elif style == 'technical': 
-        if subject:
-            body = f"""The {subject} architecture implements optimized algorithms with modular component design, enabling scalable deployment across heterogeneous operational environments and infrastructure configurations.
+    elif style == 'technical':
+        body = f"""The {subject} architecture implements optimized algorithms with modular component design, enabling scalable deployment across heterogeneous operational environments and infrastructure configurations.
 
 Technical specifications utilize industry-standard protocols enhanced with advanced fault-tolerance mechanisms. Configuration parameters support granular customization while maintaining backward compatibility with legacy systems.
 
 Performance benchmarks demonstrate substantial throughput improvements, latency reductions, and optimized resource utilization. Comprehensive API documentation and technical support facilitate seamless integration procedures."""
-            headline = f"Advanced {subject} Implementation"
-        else:
-            body = """System architecture employs distributed processing frameworks with sophisticated load-balancing algorithms to optimize resource allocation. Core components utilize asynchronous communication protocols ensuring high availability and fault tolerance.
-
-Implementation specifications strictly adhere to industry standards while providing extensibility through plugin architectures. Configuration management supports environment-specific parameters without requiring code modifications.
-
-Benchmark analyses reveal significant performance gains:  reduced latency profiles, enhanced throughput metrics, and improved scalability characteristics. Technical documentation includes comprehensive API references and deployment guides."""
-            headline = "Enterprise Technical Solutions"
+        headline = f"Advanced {subject} Implementation"
         cta = "Access Documentation"
         
     else:  # persuasive
-        if subject:
-            body = f"""Don't let another opportunity pass to discover what {subject} can accomplish for you. Thousands have already experienced game-changing benefits—now it's your turn to join them and unlock the success you deserve.
+        body = f"""Don't let another opportunity pass to discover what {subject} can accomplish for you. Thousands have already experienced game-changing benefits—now it's your turn to join them and unlock the success you deserve.
 
 The transformation happens fast. Within days, you'll notice improvements that others spend months trying to achieve. That's the power of proven strategies combined with dedicated support at every step.
 
 This opportunity won't wait indefinitely. Take decisive action now and position yourself among leaders who refuse to settle for mediocre results. Your breakthrough moment starts today."""
-            headline = f"Transform Results with {subject}"
-        else: 
-            body = """Imagine achieving in weeks what others struggle with for years. That's exactly what awaits when you take decisive action today. Thousands have already discovered these powerful advantages—advantages now within your reach.
-
-The impact speaks for itself. Success stories arrive daily from people who decided enough was enough. They stopped waiting, started executing, and never looked back on their old approaches.
-
-Your moment has arrived. Don't let hesitation steal another opportunity from you. Join those who chose to win and discover what becomes possible through commitment to excellence."""
-            headline = "Seize Your Competitive Edge"
+        headline = f"Transform Results with {subject}"
         cta = "Claim Your Spot"
     
-    return {
-        'headline': headline[: 100],
-        'body_text':  body,
-        'call_to_action': cta[:50],
-        'generated_at': datetime.now().isoformat(),
-        'fallback': True
-    }
+    return GenerationResult(
+        headline=headline[:100],
+        body_text=body,
+        call_to_action=cta[:50],
+        fallback=True,
+    )
+
 if __name__ == '__main__': 
     port = int(os.getenv('PORT', 5001))
     print(f"🤖 AI Generation Service starting on port {port}")
-    print(f"📝 Using model: gemini-1.5-flash")
-    print(f"🔑 API Key configured: {bool(GEMINI_API_KEY)}")
+    print(f"📝 Using models: {', '.join(sorted({target.model_name for target in ROUTER.targets})) or GEMINI_MODEL}")
+    print(f"🔑 API keys configured: {ROUTER.key_count}")
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
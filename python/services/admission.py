@@ -0,0 +1,122 @@
+import math
+import threading
+import time
+
+OVERLOAD_POLICIES = ('fallback', 'reject')
+
+
+class AdmissionController:
+    """
+    Bounded in-flight limit for request handlers
+
+    A request that finds `max_in_flight` requests already running waits at
+    most `max_queue_wait` seconds for a slot; after that it is shed and the
+    endpoint's overload policy decides what the client gets. Service time
+    is tracked as an EWMA to size Retry-After.
+    """
+
+    def __init__(self, max_in_flight=8, max_queue_wait=2.0, alpha=0.2):
+        self.max_in_flight = max_in_flight
+        self.max_queue_wait = max_queue_wait
+        self.alpha = alpha
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._service_ewma = None
+        self._endpoints = {}
+
+    def configure(self, max_in_flight=None, max_queue_wait=None):
+        with self._cond:
+            if max_in_flight is not None:
+                self.max_in_flight = max_in_flight
+            if max_queue_wait is not None:
+                self.max_queue_wait = max_queue_wait
+            self._cond.notify_all()
+
+    def _stats(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {
+                'admitted': 0, 'shed': {policy: 0 for policy in OVERLOAD_POLICIES},
+                'total_wait': 0.0, 'max_wait': 0.0,
+                'timed_out': 0, 'shed_total_wait': 0.0, 'shed_max_wait': 0.0,
+            }
+        return stats
+
+    def enter(self, endpoint):
+        """
+        Wait for a slot until the queue-wait deadline
+
+        Returns: admission start time (monotonic) to pass to leave(), or
+        None if the request must be shed
+        """
+        with self._cond:
+            started = time.monotonic()
+            deadline = started + self.max_queue_wait
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # Shed requests still waited - keep that out of the admitted averages
+                        waited = time.monotonic() - started
+                        stats = self._stats(endpoint)
+                        stats['timed_out'] += 1
+                        stats['shed_total_wait'] += waited
+                        stats['shed_max_wait'] = max(stats['shed_max_wait'], waited)
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            now = time.monotonic()
+            waited = now - started
+            self._in_flight += 1
+            stats = self._stats(endpoint)
+            stats['admitted'] += 1
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+            return now
+
+    def leave(self, admitted_at):
+        with self._cond:
+            self._in_flight -= 1
+            service_time = time.monotonic() - admitted_at
+            if self._service_ewma is None:
+                self._service_ewma = service_time
+            else:
+                self._service_ewma += self.alpha * (service_time - self._service_ewma)
+            self._cond.notify()
+
+    def record_shed(self, endpoint, policy):
+        with self._cond:
+            self._stats(endpoint)['shed'][policy] += 1
+
+    def retry_after(self):
+        """Seconds a rejected client should wait - roughly one service time"""
+        with self._cond:
+            estimate = self._service_ewma if self._service_ewma is not None else self.max_queue_wait
+        return min(max(math.ceil(estimate), 1), 60)
+
+    def metrics(self):
+        with self._cond:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                admitted = stats['admitted']
+                timed_out = stats['timed_out']
+                endpoints[endpoint] = {
+                    'admitted': admitted,
+                    'shed': dict(stats['shed']),
+                    'avg_queue_wait_ms': round(stats['total_wait'] / admitted * 1000, 2) if admitted else 0.0,
+                    'max_queue_wait_ms': round(stats['max_wait'] * 1000, 2),
+                    'avg_shed_wait_ms': round(stats['shed_total_wait'] / timed_out * 1000, 2) if timed_out else 0.0,
+                    'max_shed_wait_ms': round(stats['shed_max_wait'] * 1000, 2),
+                }
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queue_wait_ms': round(self.max_queue_wait * 1000),
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'service_time_ms': round(self._service_ewma * 1000, 1) if self._service_ewma is not None else None,
+                'endpoints': endpoints,
+            }
@@ -1,9 +1,13 @@
 import google.generativeai as genai
-import os
 import re
-from datetime import datetime
 
-def generate_content_with_ai(field_values, style_selected):
+from services.candidate_selection import candidate_settings, collect_candidates, select_best
+from services.generation_result import GenerationResult, PreEncodedResult
+from services.model_router import get_router
+from services.output_quality import score_output
+from services.scheduler import SCHEDULER
+
+def generate_content_with_ai(field_values, style_selected, user_id=None, priority='interactive'):
     """
     Generate content using Google Gemini API with FULLY DYNAMIC field handling
     Strict validation prevents garbage output
@@ -11,19 +15,19 @@ def generate_content_with_ai(field_values, style_selected):
     Args:  
         field_values (dict): Input field values (any fields, any names)
         style_selected (str): Tone/style for generation
+        user_id (str): Fair-share key for the shared scheduler
+        priority (str): 'interactive', 'bulk' or 'speculative'
     
     Returns: 
-        dict:   Generated content with headline, body_text, call_to_action
+        GenerationResult:   Generated content with headline, body_text, call_to_action
     """
     
-    # Configure Gemini API
-    api_key = os.getenv('GEMINI_API_KEY')
+    # Route across every configured key/model pair
+    router = get_router()
     
-    if not api_key:  
+    if not router.targets:  
         raise Exception("GEMINI_API_KEY not found in environment variables")
     
-    genai.configure(api_key=api_key)
-    
     # ✅ STRICT validation - clean and assess input
     cleaned_values, quality_score = clean_and_assess_input(field_values)
     
@@ -35,36 +39,47 @@ def generate_content_with_ai(field_values, style_selected):
         print(f"⚠️ Input quality too low (score: {quality_score}) - using intelligent fallback")
         return create_intelligent_fallback(cleaned_values, style_selected)
     
-    # Create model instance
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
-    
     # Build prompt with CLEANED data
     prompt = build_fully_dynamic_prompt(cleaned_values, style_selected)
     
+    # Best of N candidates when GEMINI_CANDIDATES > 1 (validated once, shared with app.py)
+    candidate_count, candidate_mode = candidate_settings()
+    
     try:
         print(f"🤖 Generating with {len(cleaned_values)} fields in {style_selected} style")
         
         # Generate content
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.9,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=1500,
+        def generate(count):
+            return SCHEDULER.run(
+                lambda: router.generate(
+                    prompt,
+                    prefix=STATIC_PROMPT_PREFIX,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.9,
+                        top_p=0.95,
+                        top_k=40,
+                        max_output_tokens=1500,
+                        candidate_count=count,
+                    )
+                ),
+                user_id=user_id,
+                priority=priority,
             )
-        )
         
-        # Parse response
-        generated_text = response.text
-        structured_content = parse_ai_response(generated_text, cleaned_values)
+        # Parse and score every candidate
+        structured_content, target, _ = select_best(
+            collect_candidates(generate, candidate_count, candidate_mode),
+            lambda text: parse_ai_response(text, cleaned_values),
+            lambda content: score_output(content.body_text, cleaned_values),
+        )
         
-        # ✅ Validate output - check for repetition
-        if is_output_low_quality(structured_content['body_text'], cleaned_values):
+        # ✅ Validate output - no candidate passed the repetition checks
+        if structured_content is None:
             print("⚠️ Generated content is low quality - using fallback")
             return create_intelligent_fallback(cleaned_values, style_selected)
         
-        print(f"✅ Generated:  {len(structured_content['body_text'])} chars")
+        structured_content.model = target.model_name
+        print(f"✅ Generated:  {len(structured_content.body_text)} chars")
         
         return structured_content
         
@@ -72,6 +87,15 @@ def generate_content_with_ai(field_values, style_selected):
         print(f"❌ Gemini API Error: {str(e)}")
         return create_intelligent_fallback(cleaned_values, style_selected)
 
+# Patterns for junk/placeholder data (compiled once, matched per field)
+JUNK_PATTERNS = [re.compile(pattern) for pattern in [
+    r'^(hi+|hey+|test+|testing|n/? a|null|none|placeholder|example|sample)$',
+    r'^[a-z]{1,2}$',  # Single/double letters
+    r'^(. )\1{3,}$',  # Repeated chars:  aaaa, hihihi
+    r'^(hi\s*){3,}$',  # "hi hi hi"
+    r'^\d+$',  # Just numbers
+]]
+
 def clean_and_assess_input(field_values):
     """
     Clean input data and assess quality
@@ -85,15 +109,6 @@ def clean_and_assess_input(field_values):
     total_chars = 0
     meaningful_count = 0
     
-    # Patterns for junk/placeholder data
-    junk_patterns = [
-        r'^(hi+|hey+|test+|testing|n/? a|null|none|placeholder|example|sample)$',
-        r'^[a-z]{1,2}$',  # Single/double letters
-        r'^(. )\1{3,}$',  # Repeated chars:  aaaa, hihihi
-        r'^(hi\s*){3,}$',  # "hi hi hi"
-        r'^\d+$',  # Just numbers
-    ]
-    
     for field_name, field_value in field_values.items():
         if not field_value or not str(field_value).strip():
             continue
@@ -102,7 +117,7 @@ def clean_and_assess_input(field_values):
         value_lower = value_str.lower()
         
         # Check if it's junk
-        is_junk = any(re.match(pattern, value_lower) for pattern in junk_patterns)
+        is_junk = any(pattern.match(value_lower) for pattern in JUNK_PATTERNS)
         
         # Additional junk checks
         if len(value_str) < 3:
@@ -145,61 +160,35 @@ def clean_and_assess_input(field_values):
     
     return cleaned, min(score, 100)
 
-def is_output_low_quality(body_text, cleaned_values):
-    """Check if AI output is low quality or repetitive"""
-    
-    if not body_text or len(body_text) < 100:
-        return True
-    
-    text_lower = body_text.lower()
-    
-    # Check if output still contains obvious junk from input
-    for value in cleaned_values.values():
-        value_lower = str(value).lower()
-        # If a short junk value appears many times
-        if len(value_lower) < 10:
-            count = text_lower.count(value_lower)
-            if count > 5:  # Repeated more than 5 times
-                return True
-    
-    # Split into sentences
-    sentences = re.split(r'[.!?]+', body_text)
-    sentences = [s.strip() for s in sentences if len(s.strip()) > 10]
-    
-    if len(sentences) < 3:
-        return True
-    
-    # Check for sentence-level repetition
-    sentence_starts = []
-    for sentence in sentences: 
-        words = sentence.lower().split()
-        if len(words) >= 3:
-            sentence_starts.append(' '.join(words[: 4]))  # First 4 words
-    
-    # If more than 40% of sentences start similarly
-    if len(sentence_starts) > 2:
-        unique_starts = len(set(sentence_starts))
-        if unique_starts / len(sentence_starts) < 0.6:
-            return True
-    
-    # Check for word-level excessive repetition
-    words = text_lower.split()
-    if len(words) > 20:
-        word_freq = {}
-        for word in words:
-            if len(word) > 4:  # Only substantial words
-                word_freq[word] = word_freq.get(word, 0) + 1
-        
-        if word_freq:
-            max_freq = max(word_freq.values())
-            # If any word appears more than 12% of the time
-            if max_freq > len(words) * 0.12:
-                return True
-    
-    return False
+# Fixed instruction and format block shared by every request
+STATIC_PROMPT_PREFIX = """You are an expert content strategist. Create compelling, original content from the context and writing style given after these instructions. 
+
+**CRITICAL INSTRUCTIONS:**
+1. Identify the main subject from the context
+2. Write 3-4 COMPLETELY DIFFERENT paragraphs: 
+   • Paragraph 1: Introduce the subject and its PRIMARY VALUE
+   • Paragraph 2: Explain HOW IT WORKS or KEY FEATURES
+   • Paragraph 3: Describe REAL-WORLD IMPACT and OUTCOMES  
+   • Paragraph 4: Future possibilities or NEXT STEPS
+3. NEVER EVER repeat the same word more than 2-3 times in the entire text
+4. Use RICH VOCABULARY - synonyms, varied expressions, different phrasing
+5. NO generic business clichés:  avoid "comprehensive", "cutting-edge", "proven", "solutions"
+6. Each sentence must provide UNIQUE, NEW information
+7. Use transitions but don't rehash previous points
+8. Write as if educating an intelligent reader - be specific and insightful
+
+**FORMAT (use exactly this structure):**
+
+HEADLINE: [One powerful headline, 8-12 words]
+
+BODY_TEXT: [3-4 diverse paragraphs, 280-350 words, each with distinct focus.  Maximize vocabulary variety.  Zero repetition.]
+
+CALL_TO_ACTION: [One action phrase, 3-6 words]
+
+IMPORTANT: If you find yourself using the same key terms repeatedly, STOP and rephrase with synonyms or alternative expressions."""
 
 def build_fully_dynamic_prompt(cleaned_values, style):
-    """Build prompt from CLEANED fields only"""
+    """Build the per-request prompt suffix from CLEANED fields only"""
     
     style_instructions = {
         'professional': 'formal, professional, and authoritative - suitable for business communications',
@@ -221,36 +210,11 @@ def build_fully_dynamic_prompt(cleaned_values, style):
             context_lines.append(f"• {formatted_name}: {field_value}")
         context = "\n".join(context_lines)
     
-    prompt = f"""You are an expert content strategist. Create compelling, original content. 
-
-**Context:**
+    # Only the per-request part - STATIC_PROMPT_PREFIX goes to the router as the prefix
+    prompt = f"""**Context:**
 {context}
 
-**Writing Style:** {style_desc}
-
-**CRITICAL INSTRUCTIONS:**
-1. Identify the main subject from the context above
-2. Write 3-4 COMPLETELY DIFFERENT paragraphs: 
-   • Paragraph 1: Introduce the subject and its PRIMARY VALUE
-   • Paragraph 2: Explain HOW IT WORKS or KEY FEATURES
-   • Paragraph 3: Describe REAL-WORLD IMPACT and OUTCOMES  
-   • Paragraph 4: Future possibilities or NEXT STEPS
-3. NEVER EVER repeat the same word more than 2-3 times in the entire text
-4. Use RICH VOCABULARY - synonyms, varied expressions, different phrasing
-5. NO generic business clichés:  avoid "comprehensive", "cutting-edge", "proven", "solutions"
-6. Each sentence must provide UNIQUE, NEW information
-7. Use transitions but don't rehash previous points
-8. Write as if educating an intelligent reader - be specific and insightful
-
-**FORMAT (use exactly this structure):**
-
-HEADLINE: [One powerful headline, 8-12 words]
-
-BODY_TEXT: [3-4 diverse paragraphs, 280-350 words, each with distinct focus.  Maximize vocabulary variety.  Zero repetition.]
-
-CALL_TO_ACTION: [One action phrase, 3-6 words]
-
-IMPORTANT: If you find yourself using the same key terms repeatedly, STOP and rephrase with synonyms or alternative expressions."""
+**Writing Style:** {style_desc}"""
     
     return prompt
 
@@ -285,13 +249,61 @@ def parse_ai_response(ai_text, cleaned_values):
     call_to_action = cta_match.group(1).strip() if cta_match else "Get Started"
     call_to_action = re.sub(r'[\*\#\[\]\"]', '', call_to_action).strip()
     
-    return {
-        'headline': headline,
-        'body_text': body_text,
-        'call_to_action': call_to_action,
-        'generated_at': datetime.utcnow().isoformat(),
-        'full_text': ai_text
-    }
+    return GenerationResult(
+        headline=headline,
+        body_text=body_text,
+        call_to_action=call_to_action,
+        full_text=ai_text,
+    )
+
+# Subject-less fallback copy is constant per style, so it is built and encoded once
+GENERIC_FALLBACKS = {
+    'professional': PreEncodedResult(
+        headline="Achieve Strategic Excellence",
+        body_text="""Strategic excellence demands more than conventional approaches. Organizations must embrace sophisticated frameworks that integrate operational efficiency with innovative thinking and measurable outcomes.
+
+Implementation begins with comprehensive assessment of current capabilities, followed by customized roadmaps aligned to specific objectives. Each phase builds upon previous successes while incorporating lessons learned and emerging best practices.
+
+Results speak for themselves: enhanced performance metrics, improved stakeholder satisfaction, and strengthened market position. These gains reflect our commitment to delivering sustainable value through proven methodologies and dedicated partnership.""",
+        call_to_action="Schedule Consultation",
+    ),
+    'casual': PreEncodedResult(
+        headline="Make Things Easier, Starting Now",
+        body_text="""Hey!  Looking for something that actually works? You're in the right place.  We've helped tons of people figure this out, and honestly, it's not as complicated as you might think.
+
+Here's the deal: we focus on what matters.  No fluff, no overcomplicated nonsense. Just straightforward guidance and tools that make sense from day one.
+
+The best part? Real results without the headache. People tell us all the time how much easier things got once they started.  Ready to see for yourself?""",
+        call_to_action="Let's Chat",
+    ),
+    'creative': PreEncodedResult(
+        headline="Where Vision Becomes Reality",
+        body_text="""Picture a landscape where possibilities bloom like wildflowers after spring rain. Each petal represents potential, each stem a pathway, each root a foundation for growth beyond imagination's current boundaries.
+
+Innovation dances with tradition here, creating harmonies that resonate across dimensions of experience. What begins as curiosity transforms into mastery through journeys both challenging and exhilarating.
+
+Your story deserves extraordinary chapters. The pen awaits your hand, the pages hunger for your words, and destiny whispers invitations to begin writing today.""",
+        call_to_action="Begin Your Journey",
+    ),
+    'technical': PreEncodedResult(
+        headline="Enterprise-Grade Technical Solutions",
+        body_text="""System architecture employs distributed processing frameworks with load-balancing algorithms to optimize resource allocation. Core components utilize asynchronous communication protocols, ensuring high availability and fault tolerance across network boundaries.
+
+Implementation specifications define strict adherence to industry standards while providing extensibility through plugin architectures. Configuration management supports environment-specific parameters without code modification requirements. 
+
+Benchmark analyses demonstrate significant performance gains:  reduced latency profiles, improved throughput metrics, and enhanced scalability characteristics. Technical documentation includes API references, deployment guides, and troubleshooting procedures.""",
+        call_to_action="Access Documentation",
+    ),
+    'persuasive': PreEncodedResult(
+        headline="Seize Your Competitive Edge Today",
+        body_text="""Imagine achieving in weeks what others struggle with for years. That's exactly what awaits when you take decisive action today.  Thousands have already discovered these powerful advantages—advantages now within your reach.
+
+The impact is undeniable. Success stories pour in daily from people just like you who decided enough was enough. They stopped waiting, started doing, and never looked back.
+
+Your moment is now. Don't let hesitation steal another opportunity. Join those who chose to win and discover what's possible when you commit to excellence.""",
+        call_to_action="Claim Your Spot",
+    ),
+}
 
 def create_intelligent_fallback(cleaned_values, style):
     """Create high-quality fallback based on style"""
@@ -304,96 +316,58 @@ def create_intelligent_fallback(cleaned_values, style):
         if values_by_length:
             subject = str(values_by_length[0])
     
+    if not subject:
+        return GENERIC_FALLBACKS.get(style, GENERIC_FALLBACKS['persuasive']).fresh()
+    
     # Style-specific professional content
     if style == 'professional':
-        if subject:
-            body = f"""Organizations today face unprecedented challenges in optimizing {subject}. Strategic implementation requires careful planning, stakeholder alignment, and measurable objectives that drive sustainable outcomes. 
+        body = f"""Organizations today face unprecedented challenges in optimizing {subject}. Strategic implementation requires careful planning, stakeholder alignment, and measurable objectives that drive sustainable outcomes. 
 
 Our methodology emphasizes evidence-based practices combined with adaptive frameworks. This approach enables teams to navigate complexity while maintaining focus on core priorities and operational excellence.
 
 Results demonstrate significant improvements across key performance indicators.  Clients report enhanced efficiency, stronger competitive positioning, and increased capacity for innovation—benefits that compound over time through continuous refinement."""
-            headline = f"Elevate Your {subject[: 40]} Strategy"
-        else:
-            body = """Strategic excellence demands more than conventional approaches. Organizations must embrace sophisticated frameworks that integrate operational efficiency with innovative thinking and measurable outcomes.
-
-Implementation begins with comprehensive assessment of current capabilities, followed by customized roadmaps aligned to specific objectives. Each phase builds upon previous successes while incorporating lessons learned and emerging best practices.
-
-Results speak for themselves: enhanced performance metrics, improved stakeholder satisfaction, and strengthened market position. These gains reflect our commitment to delivering sustainable value through proven methodologies and dedicated partnership."""
-            headline = "Achieve Strategic Excellence"
+        headline = f"Elevate Your {subject[: 40]} Strategy"
         cta = "Schedule Consultation"
         
-    elif style == 'casual': 
-        if subject:
-            body = f"""So you're interested in {subject}? Great choice! It's actually pretty amazing once you see how everything comes together.
+    elif style == 'casual':
+        body = f"""So you're interested in {subject}? Great choice! It's actually pretty amazing once you see how everything comes together.
 
 What makes this different is how straightforward it is.  No complicated processes or confusing jargon—just practical tools and clear guidance that actually helps you get stuff done.
 
 People love how quickly they see results. Plus, there's real support when you need it. It's like having an expert friend who's always got your back. Pretty cool, right?"""
-            headline = f"Let's Talk About {subject[: 40]}"
-        else:
-            body = """Hey!  Looking for something that actually works? You're in the right place.  We've helped tons of people figure this out, and honestly, it's not as complicated as you might think.
-
-Here's the deal: we focus on what matters.  No fluff, no overcomplicated nonsense. Just straightforward guidance and tools that make sense from day one.
-
-The best part? Real results without the headache. People tell us all the time how much easier things got once they started.  Ready to see for yourself?"""
-            headline = "Make Things Easier, Starting Now"
+        headline = f"Let's Talk About {subject[: 40]}"
         cta = "Let's Chat"
         
     elif style == 'creative':
-        if subject:
-            body = f"""Imagine {subject} as a gateway to uncharted possibilities. Like an artist discovering new colors, you'll unlock dimensions previously hidden from view—each one revealing fresh pathways toward extraordinary achievement.
+        body = f"""Imagine {subject} as a gateway to uncharted possibilities. Like an artist discovering new colors, you'll unlock dimensions previously hidden from view—each one revealing fresh pathways toward extraordinary achievement.
 
 The journey itself becomes transformative. Every interaction weaves new threads into your tapestry of success, blending innovation with intuition in ways that surprise and inspire at every turn.
 
 Your masterpiece awaits creation. The tools are ready, the canvas prepared, and the moment has arrived to paint your vision into reality with bold strokes of imagination."""
-            headline = f"Reimagine {subject[:40]}"
-        else:
-            body = """Picture a landscape where possibilities bloom like wildflowers after spring rain. Each petal represents potential, each stem a pathway, each root a foundation for growth beyond imagination's current boundaries.
-
-Innovation dances with tradition here, creating harmonies that resonate across dimensions of experience. What begins as curiosity transforms into mastery through journeys both challenging and exhilarating.
-
-Your story deserves extraordinary chapters. The pen awaits your hand, the pages hunger for your words, and destiny whispers invitations to begin writing today."""
-            headline = "Where Vision Becomes Reality"
+        headline = f"Reimagine {subject[:40]}"
         cta = "Begin Your Journey"
         
     elif style == 'technical':
-        if subject:
-            body = f"""The {subject} architecture leverages advanced algorithms and optimized data structures to maximize processing efficiency. System design incorporates modular components enabling scalable deployment across diverse operational environments.
+        body = f"""The {subject} architecture leverages advanced algorithms and optimized data structures to maximize processing efficiency. System design incorporates modular components enabling scalable deployment across diverse operational environments.
 
 Implementation utilizes industry-standard protocols with enhanced security layers and fault-tolerance mechanisms. Configuration parameters support granular customization while maintaining backward compatibility with legacy infrastructure.
 
 Performance benchmarks indicate substantial improvements in throughput, latency reduction, and resource utilization.  Comprehensive API documentation and technical support facilitate seamless integration and ongoing system maintenance."""
-            headline = f"Advanced {subject[:40]} Implementation"
-        else:
-            body = """System architecture employs distributed processing frameworks with load-balancing algorithms to optimize resource allocation. Core components utilize asynchronous communication protocols, ensuring high availability and fault tolerance across network boundaries.
-
-Implementation specifications define strict adherence to industry standards while providing extensibility through plugin architectures. Configuration management supports environment-specific parameters without code modification requirements. 
-
-Benchmark analyses demonstrate significant performance gains:  reduced latency profiles, improved throughput metrics, and enhanced scalability characteristics. Technical documentation includes API references, deployment guides, and troubleshooting procedures."""
-            headline = "Enterprise-Grade Technical Solutions"
+        headline = f"Advanced {subject[:40]} Implementation"
         cta = "Access Documentation"
         
     else:  # persuasive
-        if subject:
-            body = f"""Don't let another day pass without experiencing what {subject} can accomplish for you.  Thousands have already discovered these game-changing benefits—now it's your turn to join them and unlock success you've been missing.
+        body = f"""Don't let another day pass without experiencing what {subject} can accomplish for you.  Thousands have already discovered these game-changing benefits—now it's your turn to join them and unlock success you've been missing.
 
 The difference is remarkable. Within days, you'll notice improvements that others take months to achieve. That's the power of proven strategies combined with dedicated support at every step.
 
 This opportunity won't wait forever. Take action now and position yourself among the leaders who refuse to settle for average results. Your breakthrough starts today."""
-            headline = f"Transform Results with {subject[:40]}"
-        else:
-            body = """Imagine achieving in weeks what others struggle with for years. That's exactly what awaits when you take decisive action today.  Thousands have already discovered these powerful advantages—advantages now within your reach.
-
-The impact is undeniable. Success stories pour in daily from people just like you who decided enough was enough. They stopped waiting, started doing, and never looked back.
-
-Your moment is now. Don't let hesitation steal another opportunity. Join those who chose to win and discover what's possible when you commit to excellence."""
-            headline = "Seize Your Competitive Edge Today"
+        headline = f"Transform Results with {subject[:40]}"
         cta = "Claim Your Spot"
     
-    return {
-        'headline': headline[: 100],
-        'body_text': body,
-        'call_to_action': cta[: 50],
-        'generated_at':  datetime.utcnow().isoformat(),
-        'fallback':  True
-    }
\ No newline at end of file
+    return GenerationResult(
+        headline=headline[:100],
+        body_text=body,
+        call_to_action=cta[:50],
+        fallback=True,
+    )
\ No newline at end of file
@@ -0,0 +1,111 @@
+import os
+import threading
+
+CANDIDATE_MODES = ('api', 'parallel')
+MAX_CANDIDATES = 8
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def candidate_settings():
+    """
+    Validated best-of-N settings, read from the environment on first use
+    (after load_dotenv) and shared by every caller after that
+
+    GEMINI_CANDIDATES:     candidates per generation (1 disables best-of-N)
+    GEMINI_CANDIDATE_MODE: 'api' asks the model for N candidates in one call
+                           (candidate_count); 'parallel' makes N calls at once
+
+    Returns: (count, mode)
+    """
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                count = min(max(int(os.getenv('GEMINI_CANDIDATES', 1)), 1), MAX_CANDIDATES)
+                mode = os.getenv('GEMINI_CANDIDATE_MODE', 'api')
+                if mode not in CANDIDATE_MODES:
+                    raise ValueError(f"GEMINI_CANDIDATE_MODE must be one of {CANDIDATE_MODES}, got '{mode}'")
+                _settings = (count, mode)
+    return _settings
+
+
+def response_texts(response):
+    """Text of every candidate in a generate_content response"""
+    candidates = getattr(response, 'candidates', None)
+    if candidates and len(candidates) > 1:
+        texts = []
+        for candidate in candidates:
+            parts = getattr(getattr(candidate, 'content', None), 'parts', None) or []
+            text = ''.join(getattr(part, 'text', '') for part in parts)
+            if text:
+                texts.append(text)
+        return texts
+    return [response.text]
+
+
+def collect_candidates(generate, count, mode):
+    """
+    Gather `count` candidate texts without adding sequential round trips
+
+    `generate(candidate_count)` performs one model call and returns
+    (response, target). In parallel mode individual failures are tolerated
+    as long as one call succeeds.
+
+    Returns: list of (text, target)
+    """
+    if count == 1 or mode == 'api':
+        response, target = generate(count)
+        return [(text, target) for text in response_texts(response)]
+
+    # A thread per extra candidate, not a shared pool: every call reaches the
+    # scheduler at once and waits there by priority, never FIFO behind other
+    # requests' candidates for a free worker
+    outcomes = [None] * count
+
+    def run(index):
+        try:
+            outcomes[index] = generate(1)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,), name=f"candidate-{index}", daemon=True)
+               for index in range(1, count)]
+    for thread in threads:
+        thread.start()
+    run(0)
+    for thread in threads:
+        thread.join()
+
+    candidates = []
+    last_error = None
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            last_error = outcome
+            continue
+        response, target = outcome
+        candidates.extend((text, target) for text in response_texts(response))
+    if not candidates:
+        raise last_error
+    return candidates
+
+
+def select_best(candidates, parse, score):
+    """
+    Parse and score every candidate, keep the highest
+
+    `parse(text)` returns the structured content, `score(content)` a float
+    where 0 means unusable.
+
+    Returns: (content, target, score) - content is None if nothing scored above 0
+    """
+    best = (None, None, 0.0)
+    for text, target in candidates:
+        content = parse(text)
+        quality = score(content)
+        if quality > best[2]:
+            best = (content, target, quality)
+    if len(candidates) > 1:
+        print(f"🏁 Best of {len(candidates)} candidates scored {best[2]:.2f}")
+    return best
@@ -0,0 +1,165 @@
+import dataclasses
+import hashlib
+import json
+import threading
+import time
+
+from services.candidate_selection import response_texts
+from services.generation_result import utc_timestamp
+from services.prompt_cache import compose_prompt
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when a prompt was never recorded"""
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:32]
+
+
+def _config_dict(generation_config):
+    if generation_config is None:
+        return None
+    if dataclasses.is_dataclass(generation_config):
+        config = dataclasses.asdict(generation_config)
+    elif isinstance(generation_config, dict):
+        config = dict(generation_config)
+    else:
+        config = dict(vars(generation_config))
+    return {key: value for key, value in config.items() if value is not None}
+
+
+def iter_entries(path):
+    """Yield recorded entries in file order"""
+    with open(path, encoding='utf-8') as cassette:
+        for line in cassette:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CassetteRecorder:
+    """
+    Append-only JSON Lines log of real model calls
+
+    One compact line per call: prompt hash (h), prompt (p), config (c),
+    raw response text (t), model (m), latency in ms (ms) and wall time (at).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, prompt, generation_config, text, model_name, elapsed):
+        line = json.dumps({
+            'h': prompt_hash(prompt),
+            'p': prompt,
+            'c': _config_dict(generation_config),
+            't': text,
+            'm': model_name,
+            'ms': round(elapsed * 1000, 1),
+            'at': utc_timestamp(),
+        }, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+
+class RecordingRouter:
+    """Wrap a ModelRouter and tape every successful call to a cassette"""
+
+    def __init__(self, router, recorder):
+        self.router = router
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.router, name)
+
+    def generate(self, prompt, generation_config=None, prefix=None, **kwargs):
+        # Model latency only - router queueing and failed attempts would replay as model time
+        response, target, elapsed = self.router.generate_timed(prompt, generation_config=generation_config,
+                                                               prefix=prefix, **kwargs)
+
+        try:
+            # Taped as the full prompt so replay does not depend on prefix caching;
+            # multi-candidate responses keep their first candidate
+            self.recorder.record(compose_prompt(prefix, prompt), generation_config,
+                                 response_texts(response)[0], target.model_name, elapsed)
+        except Exception as e:
+            # Recording must never break a live request
+            print(f"⚠️ Cassette record failed: {str(e)}")
+
+        return response, target
+
+
+class ReplayResponse:
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class ReplayTarget:
+    __slots__ = ('model_name', 'label')
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.label = f"replay/{model_name}"
+
+
+class ReplayBackend:
+    """
+    Serve recorded responses instead of calling Gemini
+
+    Drop-in for ModelRouter.generate(). Prompts that were recorded more
+    than once are served in recorded order, cycling, so a replayed day is
+    deterministic. Each call sleeps for the recorded latency times
+    `latency_scale` (0 replays as fast as possible).
+    """
+
+    def __init__(self, path, latency_scale=1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._entries = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        models = {}
+        for entry in iter_entries(path):
+            self._entries.setdefault(entry['h'], []).append(entry)
+            models.setdefault(entry.get('m') or 'replay', None)
+        self.targets = [ReplayTarget(model_name) for model_name in models]
+
+    @property
+    def key_count(self):
+        return 0
+
+    def generate(self, prompt, generation_config=None, models=None, prefix=None, **kwargs):
+        key = prompt_hash(compose_prompt(prefix, prompt))
+        with self._lock:
+            recorded = self._entries.get(key)
+            if not recorded:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for prompt {key}")
+            position = self._cursor.get(key, 0)
+            self._cursor[key] = position + 1
+            self.hits += 1
+        entry = recorded[position % len(recorded)]
+
+        if self.latency_scale > 0:
+            time.sleep(entry.get('ms', 0) / 1000 * self.latency_scale)
+
+        return ReplayResponse(entry['t']), ReplayTarget(entry.get('m') or 'replay')
+
+    def usage(self):
+        with self._lock:
+            return {
+                'mode': 'replay',
+                'cassette': self.path,
+                'prompts': len(self._entries),
+                'latency_scale': self.latency_scale,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
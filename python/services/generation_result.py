@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+from json.encoder import encode_basestring_ascii
+
+# Placeholder spliced out of pre-encoded payloads; never appears in real copy
+_TIMESTAMP_SENTINEL = '@@GENERATED_AT@@'
+
+
+def utc_timestamp():
+    """Single timestamp source for every generated result"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class GenerationResult:
+    """
+    Generated card content shared by app.py and services/ai_generator.py
+
+    Slotted so the hot path allocates one small object instead of a dict
+    per result. `full_text` is only set for real model output and
+    `fallback` only for canned content, matching the old dict keys.
+    `shed` marks fallback content served because the service was overloaded.
+    `model` records which routed model produced the text; it is reported
+    in the response envelope rather than inside the content.
+    """
+
+    __slots__ = ('headline', 'body_text', 'call_to_action', 'generated_at',
+                 'fallback', 'shed', 'full_text', 'model', 'template')
+
+    def __init__(self, headline, body_text, call_to_action, generated_at=None,
+                 fallback=False, shed=False, full_text=None, model=None, template=None):
+        self.headline = headline
+        self.body_text = body_text
+        self.call_to_action = call_to_action
+        self.generated_at = generated_at or utc_timestamp()
+        self.fallback = fallback
+        self.shed = shed
+        self.full_text = full_text
+        self.model = model
+        self.template = template
+
+    def to_dict(self):
+        data = {
+            'headline': self.headline,
+            'body_text': self.body_text,
+            'call_to_action': self.call_to_action,
+            'generated_at': self.generated_at,
+        }
+        if self.fallback:
+            data['fallback'] = True
+        if self.shed:
+            data['shed'] = True
+        if self.full_text is not None:
+            data['full_text'] = self.full_text
+        return data
+
+    def to_json(self):
+        """Encode straight to a JSON string without building an intermediate dict"""
+        parts = [
+            '{"headline":', encode_basestring_ascii(self.headline),
+            ',"body_text":', encode_basestring_ascii(self.body_text),
+            ',"call_to_action":', encode_basestring_ascii(self.call_to_action),
+            ',"generated_at":', encode_basestring_ascii(self.generated_at),
+        ]
+        if self.fallback:
+            parts.append(',"fallback":true')
+        if self.shed:
+            parts.append(',"shed":true')
+        if self.full_text is not None:
+            parts.append(',"full_text":')
+            parts.append(encode_basestring_ascii(self.full_text))
+        parts.append('}')
+        return ''.join(parts)
+
+    def response_body(self, **extra):
+        """
+        Full `{'success': True, 'generated_content': ...}` response as bytes
+
+        Results created from a PreEncodedResult reuse its cached bytes and
+        only splice in their own timestamp.
+        """
+        if self.template is not None:
+            return self.template.render(self.generated_at, shed=self.shed)
+        return encode_envelope(self.to_json(), self.generated_at, extra)
+
+
+def encode_envelope(content_json, generated_at, extra):
+    parts = ['{"success":true,"generated_content":', content_json]
+    for key, value in extra.items():
+        parts.append(f',{encode_basestring_ascii(key)}:{encode_basestring_ascii(str(value))}')
+    parts.append(f',"timestamp":{encode_basestring_ascii(generated_at)}}}')
+    return ''.join(parts).encode('utf-8')
+
+
+class PreEncodedResult:
+    """
+    Constant result whose response payload is encoded once at import time
+
+    Each call to fresh() hands out a new GenerationResult with the current
+    timestamp; response_body() on it is a join of three cached byte chunks.
+    The overload-shed variant is encoded up front as well, since shedding
+    is exactly when serving it has to be cheap.
+    """
+
+    __slots__ = ('headline', 'body_text', 'call_to_action', '_chunks', '_shed_chunks')
+
+    def __init__(self, headline, body_text, call_to_action, **extra):
+        self.headline = headline
+        self.body_text = body_text
+        self.call_to_action = call_to_action
+
+        sentinel = _TIMESTAMP_SENTINEL.encode('utf-8')
+        for attribute, shed in (('_chunks', False), ('_shed_chunks', True)):
+            stamped = GenerationResult(headline, body_text, call_to_action,
+                                       generated_at=_TIMESTAMP_SENTINEL, fallback=True, shed=shed)
+            setattr(self, attribute, stamped.response_body(**extra).split(sentinel))
+
+    def fresh(self):
+        return GenerationResult(self.headline, self.body_text, self.call_to_action,
+                                fallback=True, template=self)
+
+    def render(self, generated_at, shed=False):
+        return generated_at.encode('utf-8').join(self._shed_chunks if shed else self._chunks)
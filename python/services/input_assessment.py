@@ -0,0 +1,126 @@
+import re
+
+import numpy as np
+
+# EXPANDED Junk patterns - catch MORE variations (compiled once, matched per field)
+JUNK_PATTERNS = [re.compile(pattern) for pattern in [
+    r'^(hi+|hey+|test+|testing|n/?  a|null|none|placeholder|example|sample|general|audience|default|demo)$',
+    r'^[a-z]{1,2}$',  # 1-2 letters only
+    r'^(. )\1{3,}$',  # Repeated single char:  aaaa, hhhh
+    r'^(hi\s*){2,}$',  # "hi hi hi"
+    r'^\d+$',  # Just numbers
+    r'^(. {2,4})\1{2,}$',  # Pattern repetition:  hihi, testtest, hihihihi
+    r'^(hi|test|demo).{0,10}(hi|test|demo)$',  # Variations with hi/test
+    r'^[a-z]{2,10}(d{2,}|i{2,}|h{2,})$',  # Patterns like "hihihihidd"
+]]
+
+
+def is_structural_junk(value_str, value_lower):
+    """
+    Regex, repeated-pattern and word-repetition checks for one stripped value
+
+    These are the string-shape rules of clean_and_assess_input; the length
+    and dominant-character rules live with the callers so the batch path
+    can compute them with NumPy.
+    """
+    if any(pattern.match(value_lower) for pattern in JUNK_PATTERNS):
+        return True
+
+    # Check for repetitive patterns
+    if len(value_str) >= 4:
+        # Check if it's made of 2-3 char repeated patterns
+        for pattern_len in [2, 3, 4]:
+            if len(value_str) >= pattern_len * 2:
+                pattern = value_str[:pattern_len]
+                if value_str.replace(pattern, '').replace(pattern.upper(), '') == '' or \
+                   len(value_str.replace(pattern, '')) < 3:
+                    return True
+
+    # Word repetition check
+    words = value_str.split()
+    if len(words) > 2:
+        unique_words = set(words)
+        if len(unique_words) / len(words) < 0.5:  # Less than 50% unique
+            return True
+
+    return False
+
+
+def _dominant_char_mask(lowered, lengths):
+    """True where a single character makes up more than half of the value"""
+    char_lengths = np.fromiter(map(len, lowered), dtype=np.int64, count=len(lowered))
+    # surrogatepass: JSON input may carry lone surrogates, which still count as characters
+    encoded = ''.join(lowered).encode('utf-32-le', 'surrogatepass')
+    codes = np.frombuffer(encoded, dtype=np.uint32).astype(np.int64)
+    owner = np.repeat(np.arange(len(lowered), dtype=np.int64), char_lengths)
+
+    # One histogram for the whole batch: count each (value, character) pair
+    width = int(codes.max()) + 1
+    pairs, pair_counts = np.unique(owner * width + codes, return_counts=True)
+    max_counts = np.zeros(len(lowered), dtype=np.int64)
+    np.maximum.at(max_counts, pairs // width, pair_counts)
+
+    return max_counts > lengths * 0.5
+
+
+def assess_batch(records):
+    """
+    Batched clean_and_assess_input over many field_values dicts
+
+    Length features, character histograms and scoring run as NumPy array
+    operations across every field in the batch; the string-shape rules run
+    once per distinct value, since bulk submissions repeat the same junk.
+
+    Returns: list of (cleaned_dict, score) in record order
+    """
+    record_ids = []
+    names = []
+    values = []
+    for index, field_values in enumerate(records):
+        if not field_values:
+            continue
+        for field_name, field_value in field_values.items():
+            if not field_value or not str(field_value).strip():
+                continue
+            record_ids.append(index)
+            names.append(field_name)
+            values.append(str(field_value).strip())
+
+    cleaned = [{} for _ in records]
+    if not values:
+        return [(fields, 0) for fields in cleaned]
+
+    lowered = [value.lower() for value in values]
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    record_ids = np.asarray(record_ids, dtype=np.int64)
+
+    structural = {}
+    for value_str, value_lower in zip(values, lowered):
+        if value_str not in structural:
+            structural[value_str] = is_structural_junk(value_str, value_lower)
+
+    is_junk = lengths < 4  # Too short
+    is_junk |= _dominant_char_mask(lowered, lengths)
+    is_junk |= np.fromiter((structural[value] for value in values), dtype=bool, count=len(values))
+
+    kept = np.flatnonzero(~is_junk)
+    for position in kept.tolist():
+        cleaned[record_ids[position]][names[position]] = values[position]
+
+    kept_records = record_ids[kept]
+    kept_lengths = lengths[kept]
+    field_scores = np.select([kept_lengths > 20, kept_lengths > 10], [40, 25], 10)
+
+    record_count = len(records)
+    scores = np.bincount(kept_records, weights=field_scores, minlength=record_count)
+    meaningful_count = np.bincount(kept_records, minlength=record_count)
+    total_chars = np.bincount(kept_records, weights=kept_lengths, minlength=record_count)
+
+    # Bonuses
+    scores += np.select(
+        [meaningful_count >= 3, meaningful_count == 2, meaningful_count == 1], [35, 20, 5], 0
+    )
+    scores += np.select([total_chars > 150, total_chars > 80], [25, 15], 0)
+    scores = np.minimum(scores, 100).astype(np.int64)
+
+    return list(zip(cleaned, scores.tolist()))
@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
+
+from services.prompt_cache import PrefixCache
+
+DEFAULT_MODELS = 'gemini-1.5-flash:15,gemini-2.0-flash-exp:10'
+QUOTA_COOLDOWN_SECONDS = 60.0
+MAX_ERROR_COOLDOWN_SECONDS = 30.0
+
+# Errors that say something about the target rather than the request; anything
+# else (InvalidArgument, a malformed prompt, ...) would fail on every target
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
+class RouterUnavailable(Exception):
+    """Raised when every target is cooling down or out of rate budget"""
+
+
+class RouteTarget:
+    """One (API key, model) pair with its own rate budget and health record"""
+
+    __slots__ = ('api_key', 'model_name', 'label', 'rate_per_minute', 'tokens',
+                 'refilled_at', 'latency_ewma', 'error_ewma', 'consecutive_errors',
+                 'cooldown_until', 'requests', 'errors', 'quota_errors', 'model')
+
+    def __init__(self, api_key, model_name, label, rate_per_minute):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.label = label
+        self.rate_per_minute = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.refilled_at = time.monotonic()
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.model = None
+
+    def refill(self, now):
+        elapsed = now - self.refilled_at
+        self.tokens = min(float(self.rate_per_minute), self.tokens + elapsed * self.rate_per_minute / 60.0)
+        self.refilled_at = now
+
+    def ready_at(self, now):
+        """Monotonic time at which this target can take another request"""
+        token_wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) * 60.0 / self.rate_per_minute
+        return max(self.cooldown_until, now + token_wait)
+
+    def rank(self):
+        # Untried targets rank first so every key gets measured; then measured
+        # targets by error-weighted latency; targets that were tried but never
+        # succeeded come last, fewest errors first. Ties go to the fullest bucket.
+        if self.requests == 0:
+            return (0, 0.0, -self.tokens)
+        if self.latency_ewma is None:
+            return (2, self.error_ewma, -self.tokens)
+        return (1, self.latency_ewma * (1 + 4 * self.error_ewma), -self.tokens)
+
+
+class ModelRouter:
+    """
+    Spread generation calls over a pool of API keys and models
+
+    Each target has a token-bucket rate limit (requests per minute) and
+    tracks latency/error EWMAs. A request goes to the best-ranked target
+    that is out of cooldown and has budget; on failure it fails over to the
+    next one. Quota errors (429) cool a target down for a minute, other
+    transient errors back off exponentially; request errors are raised to
+    the caller without failover or any effect on target health. Static
+    prompt prefixes go through `prefix_cache`, which tracks them per target
+    (see PrefixCache for why they are still sent inline).
+    """
+
+    def __init__(self, targets, max_wait=5.0, alpha=0.2, prefix_cache=None):
+        self.targets = list(targets)
+        self.max_wait = max_wait
+        self.alpha = alpha
+        self.prefix_cache = prefix_cache or PrefixCache()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        GEMINI_API_KEYS: comma-separated keys (falls back to GEMINI_API_KEY)
+        GEMINI_MODELS:   comma-separated `model[:requests_per_minute]`
+        GEMINI_PREFIX_CACHE_TTL: seconds a prefix cache entry lives before refresh
+        """
+        keys = [key.strip() for key in os.getenv('GEMINI_API_KEYS', '').split(',') if key.strip()]
+        if not keys and os.getenv('GEMINI_API_KEY'):
+            keys = [os.getenv('GEMINI_API_KEY')]
+
+        models = []
+        for entry in os.getenv('GEMINI_MODELS', DEFAULT_MODELS).split(','):
+            name, _, rpm = entry.strip().partition(':')
+            if name:
+                rate = int(rpm) if rpm else 15
+                if rate <= 0:
+                    raise ValueError(f"GEMINI_MODELS rate for {name} must be a positive requests-per-minute, got '{rpm}'")
+                models.append((name, rate))
+
+        targets = [
+            RouteTarget(key, name, f"key{index + 1}/{name}", rpm)
+            for index, key in enumerate(keys)
+            for name, rpm in models
+        ]
+        prefix_cache = PrefixCache(ttl_seconds=int(os.getenv('GEMINI_PREFIX_CACHE_TTL', 3600)))
+        return cls(targets, max_wait=float(os.getenv('GEMINI_ROUTER_MAX_WAIT', 5)),
+                   prefix_cache=prefix_cache)
+
+    @property
+    def key_count(self):
+        return len({target.api_key for target in self.targets})
+
+    def generate(self, prompt, generation_config=None, models=None, prefix=None, **kwargs):
+        """generate_timed() without the latency - the interface ReplayBackend mirrors"""
+        response, target, _ = self.generate_timed(prompt, generation_config=generation_config,
+                                                  models=models, prefix=prefix, **kwargs)
+        return response, target
+
+    def generate_timed(self, prompt, generation_config=None, models=None, prefix=None, **kwargs):
+        """
+        Call generate_content on the best available target, failing over on errors
+
+        `models` optionally restricts routing to the given model names.
+        `prefix` is a static instruction block sent ahead of `prompt`, resolved
+        through the prefix cache for whichever target is picked.
+        Returns: (response, RouteTarget, latency) - latency in seconds of the
+        successful call alone, without rate-limit waits or failed attempts
+        Raises: the SDK error itself for non-transient (request) errors
+        """
+        candidates = [target for target in self.targets
+                      if models is None or target.model_name in models]
+        if not candidates:
+            raise RouterUnavailable("No Gemini targets configured")
+
+        tried = set()
+        last_error = None
+        while len(tried) < len(candidates):
+            target = self._acquire([target for target in candidates if target.label not in tried])
+            if target is None:
+                break
+            tried.add(target.label)
+
+            try:
+                model, contents = self._model_for(target), prompt
+                if prefix is not None:
+                    model, contents = self.prefix_cache.prepare(target, model, prefix, prompt)
+                started = time.monotonic()
+                response = model.generate_content(
+                    contents, generation_config=generation_config, **kwargs
+                )
+            except TRANSIENT_ERRORS as e:
+                self._record_error(target, e)
+                print(f"⚠️ Router: {target.label} failed ({type(e).__name__}), failing over")
+                last_error = e
+                continue
+
+            latency = time.monotonic() - started
+            self._record_success(target, latency)
+            return response, target, latency
+
+        raise RouterUnavailable(f"All Gemini targets unavailable (last error: {last_error})")
+
+    def _acquire(self, candidates):
+        """Reserve one request of budget on the best target, waiting up to max_wait"""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for target in candidates:
+                    target.refill(now)
+                available = [target for target in candidates
+                             if target.cooldown_until <= now and target.tokens >= 1]
+                if available:
+                    target = min(available, key=RouteTarget.rank)
+                    target.tokens -= 1
+                    target.requests += 1
+                    return target
+                next_ready = min(target.ready_at(now) for target in candidates)
+
+            if next_ready > deadline:
+                return None
+            time.sleep(max(next_ready - time.monotonic(), 0.01))
+
+    def _model_for(self, target):
+        # genai.configure() sets one process-wide key, so each target gets
+        # its own service client bound to its key
+        if target.model is None:
+            with self._lock:
+                if target.model is None:
+                    model = genai.GenerativeModel(target.model_name)
+                    model._client = glm.GenerativeServiceClient(
+                        client_options={'api_key': target.api_key}
+                    )
+                    target.model = model
+        return target.model
+
+    def _record_success(self, target, latency):
+        with self._lock:
+            if target.latency_ewma is None:
+                target.latency_ewma = latency
+            else:
+                target.latency_ewma += self.alpha * (latency - target.latency_ewma)
+            target.error_ewma *= (1 - self.alpha)
+            target.consecutive_errors = 0
+
+    def _record_error(self, target, error):
+        with self._lock:
+            now = time.monotonic()
+            target.errors += 1
+            target.consecutive_errors += 1
+            target.error_ewma += self.alpha * (1 - target.error_ewma)
+            if isinstance(error, google_exceptions.ResourceExhausted):
+                target.quota_errors += 1
+                target.tokens = 0.0
+                target.cooldown_until = now + QUOTA_COOLDOWN_SECONDS
+            else:
+                backoff = min(2 ** (target.consecutive_errors - 1), MAX_ERROR_COOLDOWN_SECONDS)
+                target.cooldown_until = now + backoff
+
+    def usage(self):
+        """Per-target counters and health, without exposing the keys"""
+        with self._lock:
+            now = time.monotonic()
+            targets = []
+            for target in self.targets:
+                target.refill(now)
+                targets.append({
+                    'target': target.label,
+                    'model': target.model_name,
+                    'rate_per_minute': target.rate_per_minute,
+                    'available_tokens': round(target.tokens, 2),
+                    'requests': target.requests,
+                    'errors': target.errors,
+                    'quota_errors': target.quota_errors,
+                    'latency_ms': round(target.latency_ewma * 1000, 1) if target.latency_ewma is not None else None,
+                    'error_rate': round(target.error_ewma, 3),
+                    'cooling_down': target.cooldown_until > now,
+                })
+            return {
+                'keys': self.key_count,
+                'capacity_per_minute': sum(target.rate_per_minute for target in self.targets),
+                'targets': targets,
+                'prefix_cache': self.prefix_cache.stats(),
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """
+    Shared router, built from the environment on first use (after load_dotenv)
+
+    GEMINI_CASSETTE_MODE=record tapes live calls to GEMINI_CASSETTE_PATH;
+    GEMINI_CASSETTE_MODE=replay serves that tape instead of calling Gemini,
+    sleeping recorded latency x GEMINI_REPLAY_LATENCY_SCALE.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = _build_router()
+    return _router
+
+
+def _build_router():
+    from services.cassette import CassetteRecorder, RecordingRouter, ReplayBackend
+
+    mode = os.getenv('GEMINI_CASSETTE_MODE', '').lower()
+    path = os.getenv('GEMINI_CASSETTE_PATH', 'gemini_cassette.jsonl')
+
+    if mode == 'replay':
+        scale = float(os.getenv('GEMINI_REPLAY_LATENCY_SCALE', 1.0))
+        print(f"📼 Replaying Gemini responses from {path} (latency x{scale})")
+        return ReplayBackend(path, latency_scale=scale)
+
+    router = ModelRouter.from_env()
+    if mode == 'record':
+        print(f"📼 Recording Gemini responses to {path}")
+        return RecordingRouter(router, CassetteRecorder(path))
+    return router
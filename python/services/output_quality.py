@@ -0,0 +1,85 @@
+import re
+
+TARGET_WORDS = (280, 350)  # Body length the prompts ask for
+
+
+def score_output(body_text, cleaned_values):
+    """
+    Combined quality score for a generated body, used to rank candidates
+
+    Returns 0.0 when the text fails any of the hard checks (too short,
+    short input values echoed over and over, fewer than three sentences,
+    repeated sentence starts, one word dominating). Otherwise returns a
+    score in (0, 1] averaging how far the text stays from those limits,
+    its vocabulary variety and how close it lands to the requested length.
+    """
+    if not body_text or len(body_text) < 100:
+        return 0.0
+
+    text_lower = body_text.lower()
+
+    # Check if output still contains obvious junk from input
+    max_echo = 0
+    for value in (cleaned_values or {}).values():
+        value_lower = str(value).lower()
+        # If a short junk value appears many times
+        if len(value_lower) < 10:
+            count = text_lower.count(value_lower)
+            if count > 5:  # Repeated more than 5 times
+                return 0.0
+            max_echo = max(max_echo, count)
+
+    # Split into sentences
+    sentences = re.split(r'[.!?]+', body_text)
+    sentences = [s.strip() for s in sentences if len(s.strip()) > 10]
+
+    if len(sentences) < 3:
+        return 0.0
+
+    # Check for sentence-level repetition
+    sentence_starts = []
+    for sentence in sentences:
+        words = sentence.lower().split()
+        if len(words) >= 3:
+            sentence_starts.append(' '.join(words[:4]))  # First 4 words
+
+    start_variety = 1.0
+    # If more than 40% of sentences start similarly
+    if len(sentence_starts) > 2:
+        start_variety = len(set(sentence_starts)) / len(sentence_starts)
+        if start_variety < 0.6:
+            return 0.0
+
+    # Check for word-level excessive repetition
+    words = text_lower.split()
+    frequency_headroom = 1.0
+    vocabulary = 1.0
+    substantial = [word for word in words if len(word) > 4]  # Only substantial words
+    if substantial:
+        vocabulary = len(set(substantial)) / len(substantial)
+    if len(words) > 20 and substantial:
+        word_freq = {}
+        for word in substantial:
+            word_freq[word] = word_freq.get(word, 0) + 1
+        max_share = max(word_freq.values()) / len(words)
+        # If any word appears more than 12% of the time
+        if max_share > 0.12:
+            return 0.0
+        frequency_headroom = 1 - max_share / 0.12
+
+    low, high = TARGET_WORDS
+    length_fit = min(len(words) / low, 1.0) * min(high / len(words), 1.0)
+
+    components = (
+        start_variety,
+        frequency_headroom,
+        vocabulary,
+        length_fit,
+        1 - max_echo / 6,
+    )
+    return max(sum(components) / len(components), 0.01)
+
+
+def is_output_low_quality(body_text, cleaned_values):
+    """Check if AI output is low quality or repetitive"""
+    return score_output(body_text, cleaned_values) == 0.0
@@ -0,0 +1,125 @@
+import re
+
+from services.generation_result import GenerationResult
+
+# Output budget per section - a fraction of the 1500 tokens a full generation reserves
+SECTION_TOKEN_BUDGET = {'headline': 40, 'call_to_action': 24, 'body_paragraph': 220}
+SECTION_PATTERN = re.compile(r'^(headline|call_to_action|body_paragraph_([1-9]\d*))$')
+SECTION_CONTEXT_CHARS = 400
+CONTENT_FIELDS = ('headline', 'body_text', 'call_to_action')
+
+
+class SectionError(ValueError):
+    """Raised for content or section names a regeneration request cannot use"""
+
+
+def split_paragraphs(body_text):
+    return [paragraph.strip() for paragraph in re.split(r'\n\s*\n', body_text or '') if paragraph.strip()]
+
+
+def validate_content(generated_content):
+    """Existing content must be a dict whose text fields, when present, are strings"""
+    if not isinstance(generated_content, dict):
+        raise SectionError("generated_content must be an object")
+    for field in CONTENT_FIELDS:
+        if field in generated_content and not isinstance(generated_content[field], str):
+            raise SectionError(f"generated_content.{field} must be a string")
+
+
+def parse_sections(sections, generated_content):
+    """
+    Validate requested section names against the existing content
+
+    Accepts 'headline', 'call_to_action' and 'body_paragraph_N' (1-based).
+    Returns: list of section names in request order, without duplicates
+    """
+    paragraph_count = len(split_paragraphs(generated_content.get('body_text')))
+    parsed = []
+    for section in sections:
+        match = SECTION_PATTERN.match(str(section))
+        if not match:
+            raise SectionError(f"Unknown section '{section}'")
+        if match.group(2) and int(match.group(2)) > paragraph_count:
+            raise SectionError(f"'{section}' is out of range - body has {paragraph_count} paragraphs")
+        if section not in parsed:
+            parsed.append(section)
+    return parsed
+
+
+def output_token_budget(sections):
+    return sum(SECTION_TOKEN_BUDGET['body_paragraph' if section.startswith('body_paragraph') else section]
+               for section in sections)
+
+
+def build_partial_prompt(generated_content, sections, context, style_desc):
+    """
+    Minimal prompt covering only the requested sections
+
+    Only the text a section needs to stay coherent is included: the current
+    paragraph for a paragraph rewrite, the opening paragraph for a new
+    headline or call to action.
+    """
+    paragraphs = split_paragraphs(generated_content.get('body_text'))
+    opening = paragraphs[0][:SECTION_CONTEXT_CHARS] if paragraphs else ''
+
+    tasks = []
+    for section in sections:
+        label = section.upper()
+        if section == 'headline':
+            tasks.append(f"{label}: a new headline, 8-12 words, different from \"{generated_content.get('headline', '')}\". "
+                         f"It introduces: {opening}")
+        elif section == 'call_to_action':
+            tasks.append(f"{label}: a new call to action, 3-6 words, different from \"{generated_content.get('call_to_action', '')}\"")
+        else:
+            index = int(section.rsplit('_', 1)[1]) - 1
+            tasks.append(f"{label}: rewrite this paragraph with fresh wording, same topic, similar length:\n{paragraphs[index]}")
+
+    task_text = "\n\n".join(tasks)
+    return f"""Rewrite only the sections below for a content card.
+
+Context:
+{context}
+
+Style: {style_desc}
+
+{task_text}
+
+Reply with each section as LABEL: text, nothing else."""
+
+
+def parse_partial_response(ai_text, sections):
+    """Returns: {section: text} for every requested section found in the reply"""
+    wanted = {section.upper(): section for section in sections}
+    # Only the requested labels start a section, so lines like "NOTE: ..." stay in the text
+    label_pattern = re.compile(r'^\s*\**(' + '|'.join(map(re.escape, wanted)) + r')\**:\s*', re.MULTILINE)
+    labels = list(label_pattern.finditer(ai_text))
+
+    parsed = {}
+    for position, match in enumerate(labels):
+        section = wanted[match.group(1)]
+        end = labels[position + 1].start() if position + 1 < len(labels) else len(ai_text)
+        text = re.sub(r'[\*\#]', '', ai_text[match.end():end])
+        text = re.sub(r'\n{3,}', '\n\n', text).strip().strip('"')
+        minimum = 40 if section.startswith('body_paragraph') else 3
+        if len(text) >= minimum:
+            parsed[section] = text
+    return parsed
+
+
+def merge_sections(generated_content, replacements, model=None):
+    """Apply regenerated sections on top of the existing content"""
+    body_text = generated_content.get('body_text', '')
+    paragraph_replacements = {section: text for section, text in replacements.items()
+                              if section.startswith('body_paragraph')}
+    if paragraph_replacements:
+        paragraphs = split_paragraphs(body_text)
+        for section, text in paragraph_replacements.items():
+            paragraphs[int(section.rsplit('_', 1)[1]) - 1] = text
+        body_text = "\n\n".join(paragraphs)
+
+    return GenerationResult(
+        headline=replacements.get('headline', generated_content.get('headline', ''))[:100],
+        body_text=body_text,
+        call_to_action=replacements.get('call_to_action', generated_content.get('call_to_action', ''))[:50],
+        model=model,
+    )
@@ -0,0 +1,60 @@
+import hashlib
+import threading
+import time
+
+# Refresh a little before the entry would expire
+REFRESH_MARGIN_SECONDS = 60
+
+
+def compose_prompt(prefix, suffix):
+    """The full prompt a cached prefix stands for - also the replay/record key"""
+    return f"{prefix}\n\n{suffix}" if prefix else suffix
+
+
+class PrefixCache:
+    """
+    Local stand-in for provider context caching of static instruction prefixes
+
+    Keeps the lifecycle a provider cache needs - one entry per (target,
+    prefix), created on first use, refreshed shortly before its TTL runs
+    out - but always sends the prefix inline. The pinned SDK
+    (google-generativeai 0.3.2) has no caching API, and the instruction
+    prefixes are far below the provider's minimum cacheable size, so
+    per-request input tokens are not reduced; `inline_sends` counts every
+    call for that reason. A provider backend can replace the inline send
+    in prepare() without changing callers.
+    """
+
+    def __init__(self, ttl_seconds=3600, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._expires_at = {}
+        self._lock = threading.Lock()
+        self._stats = {'creates': 0, 'refreshes': 0, 'inline_sends': 0}
+
+    def prepare(self, target, model, prefix, suffix):
+        """
+        Returns: (model, contents) to call generate_content with
+        """
+        key = (target.label, hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:16])
+        now = self._clock()
+        margin = min(REFRESH_MARGIN_SECONDS, self.ttl_seconds / 10)
+
+        with self._lock:
+            expires_at = self._expires_at.get(key)
+            if expires_at is None or expires_at - margin <= now:
+                self._stats['refreshes' if expires_at is not None else 'creates'] += 1
+                self._expires_at[key] = now + self.ttl_seconds
+            self._stats['inline_sends'] += 1
+        return model, compose_prompt(prefix, suffix)
+
+    def stats(self):
+        with self._lock:
+            now = self._clock()
+            return {
+                'mode': 'inline',
+                'ttl_seconds': self.ttl_seconds,
+                'entries': len(self._expires_at),
+                'live_entries': sum(1 for expires_at in self._expires_at.values() if expires_at > now),
+                **self._stats,
+            }
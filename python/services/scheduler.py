@@ -0,0 +1,168 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Strict order between classes; weighted fair queuing between users inside a class
+PRIORITY_CLASSES = ('interactive', 'bulk', 'speculative')
+
+
+class _Ticket:
+    __slots__ = ('rank', 'priority', 'user_id', 'finish_tag', 'seq', 'enqueued_at')
+
+    def __init__(self, rank, priority, user_id, finish_tag, seq, enqueued_at):
+        self.rank = rank
+        self.priority = priority
+        self.user_id = user_id
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other):
+        return (self.rank, self.finish_tag, self.seq) < (other.rank, other.finish_tag, other.seq)
+
+
+class GenerationScheduler:
+    """
+    Gate in front of outbound Gemini calls
+
+    At most `max_concurrent` calls run at once. Waiting calls are served by
+    priority class first; within a class each user gets a virtual finish
+    tag (start + cost / weight), so one user queueing a large group only
+    delays their own later requests rather than everyone else's.
+    """
+
+    def __init__(self, max_concurrent=4, user_weights=None):
+        self.max_concurrent = max_concurrent
+        self.user_weights = dict(user_weights or {})
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._virtual_time = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._last_finish = {priority: {} for priority in PRIORITY_CLASSES}
+        self._stats = {
+            priority: {'queued': 0, 'dispatched': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+            for priority in PRIORITY_CLASSES
+        }
+
+    def configure(self, max_concurrent=None, user_weights=None):
+        """Apply settings read after import (e.g. from .env) to the shared instance"""
+        with self._cond:
+            if max_concurrent is not None:
+                self.max_concurrent = max_concurrent
+            if user_weights is not None:
+                self.user_weights = dict(user_weights)
+            self._cond.notify_all()
+
+    def run(self, call, user_id=None, priority='interactive', cost=1.0):
+        """Wait for a slot according to priority and fairness, then invoke `call()`"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITY_CLASSES}")
+
+        # Ids arrive from JSON; weights are keyed by the string form
+        user_key = 'anonymous' if user_id is None or user_id == '' else str(user_id)
+        ticket = self._enqueue(user_key, priority, cost)
+        self._wait_for_turn(ticket)
+        try:
+            return call()
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _enqueue(self, user_id, priority, cost):
+        weight = self.user_weights.get(user_id, 1.0)
+        with self._cond:
+            last_finish = self._last_finish[priority]
+            start = max(self._virtual_time[priority], last_finish.get(user_id, 0.0))
+            finish_tag = start + cost / weight
+            last_finish[user_id] = finish_tag
+
+            ticket = _Ticket(PRIORITY_CLASSES.index(priority), priority, user_id,
+                             finish_tag, next(self._seq), time.monotonic())
+            heapq.heappush(self._queue, ticket)
+            self._stats[priority]['queued'] += 1
+            return ticket
+
+    def _wait_for_turn(self, ticket):
+        with self._cond:
+            while self._in_flight >= self.max_concurrent or self._queue[0] is not ticket:
+                self._cond.wait()
+
+            heapq.heappop(self._queue)
+            self._in_flight += 1
+            self._advance_virtual_time(ticket)
+
+            waited = time.monotonic() - ticket.enqueued_at
+            stats = self._stats[ticket.priority]
+            stats['queued'] -= 1
+            stats['dispatched'] += 1
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+
+            # Another slot may still be free for the new head of the queue
+            self._cond.notify_all()
+
+    def _advance_virtual_time(self, ticket):
+        priority = ticket.priority
+        self._virtual_time[priority] = max(self._virtual_time[priority], ticket.finish_tag)
+
+        # Users whose tags are behind the clock behave exactly like new users
+        last_finish = self._last_finish[priority]
+        if len(last_finish) > 1000:
+            clock = self._virtual_time[priority]
+            self._last_finish[priority] = {
+                user: tag for user, tag in last_finish.items() if tag > clock
+            }
+
+    def metrics(self):
+        with self._cond:
+            oldest_wait = {priority: 0.0 for priority in PRIORITY_CLASSES}
+            now = time.monotonic()
+            for ticket in self._queue:
+                oldest_wait[ticket.priority] = max(oldest_wait[ticket.priority],
+                                                   now - ticket.enqueued_at)
+
+            classes = {}
+            for priority, stats in self._stats.items():
+                dispatched = stats['dispatched']
+                classes[priority] = {
+                    'queue_depth': stats['queued'],
+                    'dispatched': dispatched,
+                    'avg_wait_ms': round(stats['total_wait'] / dispatched * 1000, 2) if dispatched else 0.0,
+                    'max_wait_ms': round(stats['max_wait'] * 1000, 2),
+                    'oldest_waiting_ms': round(oldest_wait[priority] * 1000, 2),
+                }
+
+            return {
+                'max_concurrent': self.max_concurrent,
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._queue),
+                'classes': classes,
+            }
+
+
+def parse_user_weights(spec):
+    """
+    Parse 'user:weight,user:weight' (e.g. SCHEDULER_USER_WEIGHTS) into a dict
+
+    A weight of 2 gives that user twice the share of an unlisted user (1.0).
+    """
+    weights = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        user_id, separator, weight = item.rpartition(':')
+        try:
+            value = float(weight)
+        except ValueError:
+            value = 0.0
+        if not separator or not user_id.strip() or not value > 0:
+            raise ValueError(f"Scheduler user weights must look like 'user:2,other:0.5', got '{item.strip()}'")
+        weights[user_id.strip()] = value
+    return weights
+
+
+# Shared by app.py and services/ai_generator.py so both draw on one quota
+SCHEDULER = GenerationScheduler()
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from services.prompt_cache import PrefixCache, compose_prompt
+
+PREFIX = "Write a content card. Reply as HEADLINE:, BODY:, CALL_TO_ACTION:."
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(ttl_seconds=600):
+    clock = FakeClock()
+    return PrefixCache(ttl_seconds=ttl_seconds, clock=clock), clock
+
+
+def target(label='key1/gemini-1.5-flash'):
+    return SimpleNamespace(label=label)
+
+
+def test_prefix_is_sent_inline_with_the_suffix():
+    cache, _ = make_cache()
+    model = object()
+
+    bound, contents = cache.prepare(target(), model, PREFIX, "Context: launch")
+
+    assert bound is model
+    assert contents == compose_prompt(PREFIX, "Context: launch")
+    assert cache.stats()['inline_sends'] == 1
+
+
+def test_first_use_creates_one_entry_per_target_and_prefix():
+    cache, _ = make_cache()
+
+    cache.prepare(target(), None, PREFIX, "a")
+    cache.prepare(target(), None, PREFIX, "b")
+    cache.prepare(target('key2/gemini-1.5-flash'), None, PREFIX, "c")
+    cache.prepare(target(), None, PREFIX + " Be brief.", "d")
+
+    stats = cache.stats()
+    assert stats['creates'] == 3
+    assert stats['refreshes'] == 0
+    assert stats['entries'] == stats['live_entries'] == 3
+    assert stats['inline_sends'] == 4
+
+
+def test_entry_is_refreshed_inside_the_margin_before_expiry():
+    cache, clock = make_cache(ttl_seconds=600)  # margin is ttl / 10 = 60s
+    cache.prepare(target(), None, PREFIX, "a")
+
+    clock.now += 539
+    cache.prepare(target(), None, PREFIX, "b")
+    assert cache.stats()['refreshes'] == 0
+
+    clock.now += 2
+    cache.prepare(target(), None, PREFIX, "c")
+    assert cache.stats()['refreshes'] == 1
+
+    # The refresh restarted the TTL
+    clock.now += 539
+    cache.prepare(target(), None, PREFIX, "d")
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_expired_entry_is_refreshed_not_recreated():
+    cache, clock = make_cache(ttl_seconds=600)
+    cache.prepare(target(), None, PREFIX, "a")
+
+    clock.now += 601
+    assert cache.stats()['live_entries'] == 0
+
+    cache.prepare(target(), None, PREFIX, "b")
+    stats = cache.stats()
+    assert stats['creates'] == 1
+    assert stats['refreshes'] == 1
+    assert stats['entries'] == stats['live_entries'] == 1